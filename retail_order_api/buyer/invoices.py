@@ -0,0 +1,108 @@
+import csv
+import io
+import json
+import os
+from pathlib import Path
+from django.conf import settings
+from django.template.loader import get_template
+
+from .models import Order, OrderPosition
+
+
+INVOICE_HTML_TEMPLATE = 'buyer/invoice.html'
+INVOICE_TEXT_TEMPLATE = 'buyer/invoice.txt'
+CSV_HEADER = ('№', 'Товар', 'Магазин', 'Цена', 'Количество', 'Сумма')
+
+
+def get_invoice_positions(orders_ids, shop_id=None):
+    """
+    Loads the positions of the orders, only those of the shop if one is
+    given, together with the orders, their addresses, products and shops in
+    a single query and groups them by order.
+    """
+    positions = OrderPosition.objects.filter(order_id__in=orders_ids)
+    if shop_id is not None:
+        positions = positions.filter(shop_id=shop_id)
+    grouped = {}
+    for position in (positions.select_related('order__address', 'product_card__product', 'shop').
+                     order_by('order_id', 'id')):
+        grouped.setdefault(position.order_id, []).append(position)
+    return grouped
+
+
+def render_csv(lines):
+    stream = io.StringIO()
+    writer = csv.writer(stream, delimiter=';')
+    writer.writerow(CSV_HEADER)
+    for number, line in enumerate(lines, start=1):
+        writer.writerow((number, line['product'], line['shop'], line['price'], line['quantity'], line['amount']))
+    return stream.getvalue()
+
+
+def render_invoice(order, positions, templates=None):
+    html_template, text_template = templates or (get_template(INVOICE_HTML_TEMPLATE),
+                                                 get_template(INVOICE_TEXT_TEMPLATE))
+    lines = [{'product': position.product_card.product.name, 'shop': position.shop.name if position.shop else '',
+              'price': position.price, 'quantity': position.quantity, 'amount': position.price_per_quantity}
+             for position in positions]
+    context = {'order': order, 'address': order.address, 'positions': lines,
+               'total': sum((line['amount'] for line in lines), 0)}
+    return {'html': html_template.render(context), 'text': text_template.render(context), 'csv': render_csv(lines)}
+
+
+def get_invoice_path(order_id, updated_at, shop_id=None):
+    version = int(updated_at.timestamp() * 1000000)
+    name = f'{version}.json' if shop_id is None else f'{version}.shop_{shop_id}.json'
+    return Path(settings.INVOICE_CACHE_DIR) / str(order_id) / name
+
+
+def load_invoice(path):
+    try:
+        with path.open(encoding='utf-8') as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_invoice(path, invoice):
+    """
+    Writes the invoice next to its final path and renames it into place, so
+    readers never see a partial file, then drops the renders of the order's
+    previous versions, whole or per shop.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with temporary.open('w', encoding='utf-8') as file:
+        json.dump(invoice, file, ensure_ascii=False)
+    os.replace(temporary, path)
+    version = path.name.split('.', 1)[0]
+    for stale in path.parent.glob('*.json'):
+        if stale.name.split('.', 1)[0] != version:
+            stale.unlink(missing_ok=True)
+
+
+def get_invoices(orders_ids, shop_id=None):
+    """
+    Returns the invoices of the orders by order id, limited to the positions
+    of the shop if one is given. Renders are cached on disk under the order
+    id and its updated_at, so only the orders changed since their last
+    render are loaded and rendered again.
+    """
+    invoices = {}
+    paths = {order_id: get_invoice_path(order_id, updated_at, shop_id)
+             for order_id, updated_at in Order.objects.filter(id__in=orders_ids).values_list('id', 'updated_at')}
+    for order_id, path in paths.items():
+        invoice = load_invoice(path)
+        if invoice is not None:
+            invoices[order_id] = invoice
+    missing = [order_id for order_id in paths if order_id not in invoices]
+    if missing:
+        templates = get_template(INVOICE_HTML_TEMPLATE), get_template(INVOICE_TEXT_TEMPLATE)
+        for order_id, positions in get_invoice_positions(missing, shop_id).items():
+            invoice = invoices[order_id] = render_invoice(positions[0].order, positions, templates)
+            save_invoice(paths[order_id], invoice)
+    return invoices
+
+
+def get_invoice(order_id, shop_id=None):
+    return get_invoices([order_id], shop_id).get(order_id)
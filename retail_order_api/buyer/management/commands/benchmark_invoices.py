@@ -0,0 +1,77 @@
+import shutil
+from decimal import Decimal
+from pathlib import Path
+from time import perf_counter
+from uuid import uuid4
+from celery import group
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from products.models import Category, Product, ProductCard
+from seller.models import Shop
+from buyer.models import Address, Order, OrderPosition
+from buyer.tasks import render_invoices_task
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Measures rendering order invoices with render_invoices_task in Celery sized batches, '
+            'cold and from the disk cache.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--positions', type=int, default=5)
+        parser.add_argument('--batch', type=int, default=1000)
+        parser.add_argument('--local', action='store_true',
+                            help='Run the tasks in this process instead of sending them to the workers.')
+
+    def create_orders(self, token, count, positions_count):
+        seller = User.objects.create_user(email=f'seller.{token}@example.com', password=token,
+                                          is_active=True, type='seller')
+        buyer = User.objects.create_user(email=f'buyer.{token}@example.com', password=token,
+                                         is_active=True, type='buyer')
+        shop = Shop.objects.create(name='Связной', user=seller)
+        category = Category.objects.create(id=(Category.objects.aggregate(Max('id'))['id__max'] or 0) + 1,
+                                           name=f'Смартфоны {token}')
+        address = Address.objects.create(user=buyer, city='Москва', street='Невского', house='41', apartment='12')
+        products = Product.objects.bulk_create([Product(name=f'Смартфон Apple iPhone XR {number} {token}',
+                                                        category=category) for number in range(positions_count)])
+        cards = ProductCard.objects.bulk_create([
+            ProductCard(product_code=number, product=product, shop=shop, price=Decimal('65000.00'),
+                        price_rrc=Decimal('70000.00'), quantity=count * 2)
+            for number, product in enumerate(products)
+        ])
+        orders = Order.objects.bulk_create([
+            Order(user=buyer, address=address, first_name='Иван', last_name='Иванов', phone='89167490856')
+            for _ in range(count)
+        ])
+        OrderPosition.objects.bulk_create([
+            OrderPosition(order=order, product_card=card, shop=shop, price=card.price, quantity=2)
+            for order in orders for card in cards
+        ], batch_size=5000)
+        return [seller, buyer], category, [order.id for order in orders]
+
+    def render(self, batches, local):
+        tasks = group(render_invoices_task.s(orders_ids) for orders_ids in batches)
+        started = perf_counter()
+        result = tasks.apply() if local else tasks.apply_async()
+        rendered = sum(result.get())
+        return perf_counter() - started, rendered
+
+    def handle(self, *args, orders, positions, batch, local, **options):
+        token = uuid4().hex[:12]
+        users, category, orders_ids = self.create_orders(token, orders, positions)
+        try:
+            batches = [orders_ids[start:start + batch] for start in range(0, len(orders_ids), batch)]
+            for label in ('Rendered', 'Loaded cached'):
+                elapsed, rendered = self.render(batches, local)
+                self.stdout.write(f'{label} {rendered} invoices in {len(batches)} batches: {elapsed:.2f} s')
+        finally:
+            for order_id in orders_ids:
+                shutil.rmtree(Path(settings.INVOICE_CACHE_DIR) / str(order_id), ignore_errors=True)
+            User.objects.filter(id__in=[user.id for user in users]).delete()
+            category.delete()
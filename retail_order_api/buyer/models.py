@@ -5,6 +5,7 @@ from decimal import Decimal
 from rest_framework import serializers
 
 from products.models import ProductCard
+from seller.models import Shop
 from .exceptions import LimitError
 
 
@@ -91,6 +92,11 @@ class Order(models.Model):
     status = models.CharField(choices=STATUS_CHOICES, max_length=9, default='new')
     address = models.ForeignKey(Address, on_delete=models.CASCADE, related_name='orders')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+        ]
+
 
 class OrderPosition(models.Model):
 
@@ -107,6 +113,8 @@ class OrderPosition(models.Model):
     )
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='positions')
     quantity = models.PositiveIntegerField()
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='order_positions',
+                             blank=True, null=True)
 
     class Meta:
         verbose_name = "Order's position"
@@ -114,8 +122,20 @@ class OrderPosition(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['order', 'product_card'], name='unique_order_position'),
         ]
+        indexes = [
+            models.Index(fields=['shop', 'order'], name='position_shop_order_idx'),
+        ]
 
 
+class StockReservation(models.Model):
+    product_card = models.ForeignKey(ProductCard, on_delete=models.CASCADE, related_name='reservations')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock_reservations')
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    expires_at = models.DateTimeField(db_index=True)
 
-
-
+    class Meta:
+        verbose_name = 'Stock reservation'
+        verbose_name_plural = 'Stock reservations'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product_card'], name='unique_stock_reservation'),
+        ]
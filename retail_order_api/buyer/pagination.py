@@ -0,0 +1,16 @@
+from rest_framework.pagination import CursorPagination
+
+
+class OrderCursorPagination(CursorPagination):
+    """
+    Keyset pagination of orders from the newest one, backed by the
+    (user, -created_at) index.
+    """
+    ordering = '-created_at'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_page(self, queryset, request, view=None):
+        results = self.paginate_queryset(queryset, request, view)
+        return {'next': self.get_next_link(), 'previous': self.get_previous_link(), 'results': results}
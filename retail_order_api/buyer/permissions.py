@@ -12,4 +12,4 @@ class IsOwner(BasePermission):
     message = ('The user is not the owner.')
 
     def has_object_permission(self, request, view, obj):
-       return request.user == obj.user
+       return request.user.id == obj.user_id
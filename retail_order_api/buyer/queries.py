@@ -0,0 +1,21 @@
+from django.db.models import Prefetch
+
+from .models import Order, OrderPosition
+
+
+def get_positions(shop=None):
+    positions = OrderPosition.objects.select_related('product_card__product', 'product_card__shop').order_by('id')
+    if shop is not None:
+        positions = positions.filter(shop=shop)
+    return positions
+
+
+def get_order_detail(shop=None, to_attr=None):
+    """
+    Plans an order detail read: the order and its address in one query and
+    all its positions with their products and shops in a second one, no
+    matter how many positions the order has. With a shop only the
+    positions of that shop are loaded.
+    """
+    return (Order.objects.select_related('address').
+            prefetch_related(Prefetch('positions', queryset=get_positions(shop), to_attr=to_attr)))
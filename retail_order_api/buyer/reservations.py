@@ -0,0 +1,115 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from products.stock import take_stock, return_stock, lock_product_cards
+from products.catalogue import refresh_catalogue
+from .models import StockReservation
+
+
+def reservations_enabled():
+    return settings.STOCK_RESERVATION_ENABLED
+
+
+def hold_stock(user, product_card, quantity):
+    """
+    Sets the user's hold on the product card to the quantity. Only the
+    difference with the current hold is taken from or returned to the stock.
+    """
+    with transaction.atomic():
+        reservation = (StockReservation.objects.select_for_update().
+                       filter(user=user, product_card=product_card).first())
+        held = reservation.quantity if reservation else 0
+        if quantity > held:
+            take_stock({product_card.id: quantity - held})
+        elif quantity < held:
+            return_stock({product_card.id: held - quantity})
+        StockReservation.objects.update_or_create(
+            user=user, product_card=product_card,
+            defaults={'quantity': quantity,
+                      'expires_at': timezone.now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL)})
+        refresh_catalogue([product_card.id])
+
+
+def release_reservations(reservations):
+    """
+    Returns the stock of the locked reservations queryset and deletes them.
+    Must be called inside a transaction.
+    """
+    reservations = list(reservations.order_by('id'))
+    quantities = {}
+    for reservation in reservations:
+        quantities[reservation.product_card_id] = quantities.get(reservation.product_card_id, 0) + reservation.quantity
+    return_stock(quantities)
+    StockReservation.objects.filter(id__in=[reservation.id for reservation in reservations]).delete()
+    refresh_catalogue(quantities)
+    return len(reservations)
+
+
+def release_stock(user, product_cards_ids=None):
+    reservations = StockReservation.objects.filter(user=user)
+    if product_cards_ids is not None:
+        reservations = reservations.filter(product_card_id__in=product_cards_ids)
+    with transaction.atomic():
+        return release_reservations(reservations.select_for_update())
+
+
+def release_expired_stock():
+    with transaction.atomic():
+        reservations = (StockReservation.objects.filter(expires_at__lte=timezone.now()).
+                        select_for_update(skip_locked=True))
+        return release_reservations(reservations)
+
+
+def convert_reservations(user, quantities):
+    """
+    Consumes the user's holds for the checkout quantities. Only the part not
+    covered by a hold is taken from the stock with row locks, and any excess
+    hold is returned. Must be called inside a transaction.
+    """
+    reservations = (StockReservation.objects.select_for_update().
+                    filter(user=user, product_card_id__in=quantities).order_by('id'))
+    held = {reservation.product_card_id: reservation.quantity for reservation in reservations}
+    missing = {card_id: quantity - held.get(card_id, 0) for card_id, quantity in quantities.items()
+               if quantity > held.get(card_id, 0)}
+    excess = {card_id: quantity - quantities[card_id] for card_id, quantity in held.items()
+              if quantity > quantities[card_id]}
+    if missing:
+        take_stock(missing)
+    return_stock(excess)
+    StockReservation.objects.filter(user=user, product_card_id__in=held).delete()
+
+
+def lock_holds(cards_ids):
+    """
+    Locks the holds on the product cards and then the cards themselves, in
+    the order hold_stock takes them, and returns the held quantities by
+    card. Must be called inside a transaction.
+    """
+    list(StockReservation.objects.select_for_update().filter(product_card_id__in=cards_ids).
+         order_by('id').values_list('id', flat=True))
+    lock_product_cards(cards_ids)
+    return dict(StockReservation.objects.filter(product_card_id__in=cards_ids).order_by().
+                values('product_card_id').annotate(held=Sum('quantity')).values_list('product_card_id', 'held'))
+
+
+def trim_holds(limits):
+    """
+    Shrinks the holds on each product card, newest first, until they total
+    at most the card's limit; holds shrunk to nothing are deleted.
+    Must be called with the holds locked by lock_holds().
+    """
+    remaining = dict(limits)
+    trimmed, deleted = [], []
+    for reservation in StockReservation.objects.filter(product_card_id__in=limits).order_by('product_card_id', 'id'):
+        quantity = min(reservation.quantity, remaining[reservation.product_card_id])
+        remaining[reservation.product_card_id] -= quantity
+        if quantity == 0:
+            deleted.append(reservation.id)
+        elif quantity < reservation.quantity:
+            reservation.quantity = quantity
+            trimmed.append(reservation)
+    StockReservation.objects.bulk_update(trimmed, ['quantity'])
+    StockReservation.objects.filter(id__in=deleted).delete()
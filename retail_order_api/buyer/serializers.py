@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from decimal import Decimal
 
-from .models import CartPosition, Address, Order, OrderPosition
+from .models import CartPosition, Address, Order, OrderPosition, STATUS_CHOICES
 from products.models import ProductCard, Product
 
 
@@ -15,12 +15,12 @@ class CartPositionSerializer(serializers.ModelSerializer):
 
 
     def validate_product_card(self, value):
-        if value.status == 'sold' or value.status == 'withdrawn':
+        if value.status == 'withdrawn' or (value.status == 'sold' and self.context.get('check_stock', True)):
             raise serializers.ValidationError(f"The product is sold or withdrawn.")
         return value
 
     def validate(self, data):
-        if (data['product_card'].quantity - data['quantity']) < 0:
+        if self.context.get('check_stock', True) and (data['product_card'].quantity - data['quantity']) < 0:
             raise serializers.ValidationError(f"Quantity exceeds the actual stock of the product.")
         return data
 
@@ -80,35 +80,50 @@ class OrderSerializer(serializers.ModelSerializer):
 
 class OrderListSerializer(serializers.ModelSerializer):
     created_at = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S")
+    total = serializers.DecimalField(max_digits=15, decimal_places=2, min_value=Decimal('0.00'))
 
     class Meta:
         model = Order
-        fields = ('id', 'created_at', 'status',)
-
-
-class OrderNewSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Order
-        fields = ('id',)
-
-
-
-
-
-
-
-
-
-
+        fields = ('id', 'created_at', 'status', 'total')
 
 
+class OrderListPageSerializer(serializers.Serializer):
+    next = serializers.URLField(allow_null=True)
+    previous = serializers.URLField(allow_null=True)
+    results = OrderListSerializer(many=True)
 
 
+class OrderFilterSerializer(serializers.Serializer):
+    data = serializers.DateField(required=False)
+    to = serializers.DateField(required=False)
+    status = serializers.MultipleChoiceField(choices=STATUS_CHOICES, required=False)
 
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['from'] = serializers.DateField(required=False)
+        return fields
 
+    def validate(self, data):
+        if data.get('data'):
+            data.setdefault('from', data['data'])
+            data.setdefault('to', data['data'])
+        if data.get('from') and data.get('to') and data['from'] > data['to']:
+            raise serializers.ValidationError("'from' date must not be later than 'to' date.")
+        return data
 
 
+class OrderNewSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Order
+        fields = ('id',)
 
 
+class InsufficientStockItemSerializer(serializers.Serializer):
+    product_card = serializers.IntegerField()
+    requested = serializers.IntegerField()
+    available = serializers.IntegerField()
 
 
+class InsufficientStockSerializer(serializers.Serializer):
+    detail = serializers.CharField()
+    items = InsufficientStockItemSerializer(many=True)
@@ -1,8 +1,13 @@
 from django.dispatch import receiver
 from django.dispatch import Signal
+from django.db.models.signals import post_save
 from django.conf import settings
 
 from .tasks import send_invoice_to_email_task
+from .models import Order
+from seller.models import Shop
+from retail_order_api.versions import bump_versions
+from retail_order_api.dispatch import dispatch
 
 
 new_order = Signal()
@@ -11,11 +16,16 @@ new_order = Signal()
 @receiver(new_order, dispatch_uid="new_order")
 def send_invoice_to_email(order, buyer_email, **kwargs):
     order_id = order.id
-    send_invoice_to_email_task.delay(order_id, buyer_email)
-
-
-
+    dispatch(send_invoice_to_email_task, order_id, buyer_email)
 
 
+def bump_order_versions(order):
+    sellers_ids = (Shop.objects.filter(order_positions__order=order).
+                   values_list('user_id', flat=True).distinct())
+    bump_versions([f'orders:user:{order.user_id}', *[f'orders:seller:{seller_id}' for seller_id in sellers_ids]])
 
 
+@receiver(post_save, sender=Order, dispatch_uid="post_save_order_versions")
+def bump_saved_order_versions(sender, instance, created, **kwargs):
+    if not created:
+        bump_order_versions(instance)
@@ -1,14 +1,44 @@
-from django.core.mail import EmailMultiAlternatives
 from celery import shared_task
 from django.conf import settings
 
+from mailer.models import OutboundEmail
+from mailer.outbox import queue_email, queue_emails
+from .models import Order
+from .reservations import release_expired_stock
+from .invoices import get_invoice, get_invoices
+
 
 @shared_task()
 def send_invoice_to_email_task(order_id, buyer_email):
-    msg = EmailMultiAlternatives(
+    invoice = get_invoice(order_id)
+    queue_email(
         f"Заказ {order_id}",
-        f"Накладная по заказу {order_id}",
-        settings.EMAIL_HOST_USER,
-        [buyer_email]
+        invoice['text'],
+        [buyer_email],
+        html_body=invoice['html'],
+        attachments=[{'filename': f'invoice_{order_id}.csv', 'content': invoice['csv'], 'mimetype': 'text/csv'}]
     )
-    msg.send()
\ No newline at end of file
+
+
+@shared_task()
+def render_invoices_task(orders_ids):
+    return len(get_invoices(orders_ids))
+
+
+@shared_task()
+def release_expired_reservations_task():
+    return release_expired_stock()
+
+
+@shared_task()
+def send_order_status_notifications_task(orders_ids, status):
+    emails = queue_emails([
+        OutboundEmail(
+            subject=f"Заказ {order_id}",
+            body=f"Статус заказа {order_id} изменён: {status}",
+            from_email=settings.EMAIL_HOST_USER,
+            to=[email]
+        )
+        for order_id, email in Order.objects.filter(id__in=orders_ids).values_list('id', 'user__email')
+    ])
+    return len(emails)
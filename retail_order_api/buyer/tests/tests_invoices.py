@@ -0,0 +1,92 @@
+import io
+from unittest import mock
+from tempfile import TemporaryDirectory
+from pathlib import Path
+from decimal import Decimal
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+
+from products.models import Category, Product, ProductCard
+from seller.models import Shop
+from mailer.models import OutboundEmail
+from buyer.models import Address, Order, OrderPosition
+from buyer.invoices import get_invoice, get_invoices
+from buyer.tasks import send_invoice_to_email_task
+
+User = get_user_model()
+
+
+class InvoiceTest(TestCase):
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(INVOICE_CACHE_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.directory = Path(directory.name)
+        seller = User.objects.create_user(first_name='Ivan', last_name='Ivanov', email='ivan.ivanov@gmail.com',
+                                          is_active=True, type='seller', password='12345678')
+        buyer = User.objects.create_user(first_name='Maria', last_name='Petrova', email='maria.petrova@gmail.com',
+                                         is_active=True, type='buyer', password='12345678')
+        shop = Shop.objects.create(name='Связной', user=seller)
+        self.shop = shop
+        category = Category.objects.create(id=224, name='Смартфоны')
+        address = Address.objects.create(user=buyer, city='Москва', street='Невского', house='41')
+        self.orders = []
+        for number in range(2):
+            product = Product.objects.create(name=f'Смартфон {number}', category=category)
+            card = ProductCard.objects.create(product_code=number, model='model', product=product, shop=shop,
+                                              price=Decimal('100'), price_rrc=Decimal('110'), quantity=10)
+            order = Order.objects.create(user=buyer, address=address, first_name='Maria', last_name='Petrova',
+                                         phone='89372773838')
+            OrderPosition.objects.create(order=order, product_card=card, shop=shop, price=card.price,
+                                         quantity=number + 2)
+            self.orders.append(order)
+
+    def test_render_invoice(self):
+        order = self.orders[0]
+        with self.assertNumQueries(2):
+            invoice = get_invoice(order.id)
+        self.assertIn(f'Накладная по заказу {order.id}', invoice['html'])
+        self.assertIn('Смартфон 0 (Связной): 100.00 x 2 = 200.00', invoice['text'])
+        self.assertIn('Итого: 200.00', invoice['text'])
+        self.assertEqual(['№;Товар;Магазин;Цена;Количество;Сумма', '1;Смартфон 0;Связной;100.00;2;200.00'],
+                         invoice['csv'].splitlines())
+
+    def test_cached_invoices(self):
+        invoices = get_invoices([order.id for order in self.orders])
+        with mock.patch('buyer.invoices.render_invoice') as render_invoice, self.assertNumQueries(1):
+            self.assertEqual(invoices, get_invoices([order.id for order in self.orders]))
+        render_invoice.assert_not_called()
+
+        order = self.orders[0]
+        order.phone = '89000000000'
+        order.save()
+        self.assertIn('89000000000', get_invoice(order.id)['text'])
+        self.assertEqual(1, len(list((self.directory / str(order.id)).iterdir())))
+
+    def test_shop_invoice(self):
+        order = self.orders[1]
+        get_invoice(order.id)
+        invoice = get_invoice(order.id, shop_id=self.shop.id)
+        self.assertEqual(['№;Товар;Магазин;Цена;Количество;Сумма', '1;Смартфон 1;Связной;100.00;3;300.00'],
+                         invoice['csv'].splitlines())
+        self.assertEqual(2, len(list((self.directory / str(order.id)).iterdir())))
+        self.assertIsNone(get_invoice(order.id, shop_id=self.shop.id + 1))
+
+    def test_benchmark_invoices(self):
+        output = io.StringIO()
+        call_command('benchmark_invoices', orders=3, positions=2, batch=2, local=True, stdout=output)
+        self.assertIn('Rendered 3 invoices in 2 batches', output.getvalue())
+        self.assertIn('Loaded cached 3 invoices in 2 batches', output.getvalue())
+        self.assertEqual((2, 2), (Order.objects.count(), User.objects.count()))
+        self.assertEqual([], list(self.directory.iterdir()))
+
+    def test_send_invoice_to_email(self):
+        order = self.orders[1]
+        send_invoice_to_email_task(order.id, 'maria.petrova@gmail.com')
+        email = OutboundEmail.objects.get(subject=f'Заказ {order.id}')
+        self.assertIn('Итого: 300.00', email.body)
+        self.assertEqual([f'invoice_{order.id}.csv'], [attachment['filename'] for attachment in email.attachments])
@@ -0,0 +1,181 @@
+from rest_framework.test import APITestCase
+from django.test import TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+from django.db import connection
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from datetime import timedelta
+from decimal import Decimal
+from threading import Thread, Barrier
+
+from products.models import Category, Product, ProductCard, CatalogueEntry
+from seller.models import Shop
+from buyer.models import CartPosition, Order, StockReservation
+from seller.importer import PriceListImporter
+from buyer.reservations import release_expired_stock, release_stock
+
+User = get_user_model()
+
+ORDER_DATA = {
+    "first_name": "Иван",
+    "last_name": "Иванов",
+    "phone": "89167490856",
+    "address": {
+        "city": "Москва",
+        "street": "Невского",
+        "house": 41
+    }
+}
+
+
+def create_product_card(quantity):
+    seller = User.objects.create_user(first_name='Ivan', last_name='Ivanov', email='ivan.ivanov@gmail.com',
+                                      is_active=True, type='seller', password='12345678')
+    shop = Shop.objects.create(name='Связной', user=seller)
+    category = Category.objects.create(id=224, name='Смартфоны')
+    product = Product.objects.create(name='Смартфон Apple iPhone XR 256GB (красный)', category=category)
+    return ProductCard.objects.create(product_code=4244124, model='apple/iphone/xr', product=product, shop=shop,
+                                      price=Decimal('65000'), price_rrc=Decimal('69990'), quantity=quantity)
+
+
+def create_buyer(number):
+    buyer = User.objects.create_user(first_name='Maria', last_name='Petrova', email=f'maria.petrova{number}@gmail.com',
+                                     is_active=True, type='buyer', password='12345678')
+    return buyer, Token.objects.create(user=buyer)
+
+
+@override_settings(STOCK_RESERVATION_ENABLED=True, STOCK_RESERVATION_TTL=900)
+class StockReservationTest(APITestCase):
+
+    def setUp(self):
+        self.product_card = create_product_card(quantity=5)
+        self.buyer, self.buyer_auth_token = create_buyer(1)
+        self.other_buyer, self.other_buyer_auth_token = create_buyer(2)
+
+    def put_cart_position(self, token, quantity):
+        return self.client.put(reverse('buyer:cart_position'), headers={'Authorization': f'Token {token}'},
+                               data={'product_card': self.product_card.id, 'quantity': quantity})
+
+    def test_cart_position_holds_stock(self):
+        response = self.put_cart_position(self.buyer_auth_token, 3)
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.product_card.refresh_from_db()
+        self.assertEqual(2, self.product_card.quantity)
+        entry = CatalogueEntry.objects.get(product_card=self.product_card)
+        self.assertEqual((2, 3), (entry.quantity, entry.reserved))
+        response = self.put_cart_position(self.other_buyer_auth_token, 3)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        response = self.put_cart_position(self.buyer_auth_token, 5)
+        self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+        self.product_card.refresh_from_db()
+        self.assertEqual(0, self.product_card.quantity)
+        self.assertEqual('sold', self.product_card.status)
+        self.assertEqual(5, StockReservation.objects.get(user=self.buyer).quantity)
+
+    def test_delete_cart_position_releases_stock(self):
+        self.put_cart_position(self.buyer_auth_token, 5)
+        response = self.client.delete(reverse('buyer:cart_position'),
+                                      headers={'Authorization': f'Token {self.buyer_auth_token}'},
+                                      data={'product_card': self.product_card.id})
+        self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+        self.product_card.refresh_from_db()
+        self.assertEqual(5, self.product_card.quantity)
+        self.assertEqual('in_stock', self.product_card.status)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_release_expired_stock(self):
+        self.put_cart_position(self.buyer_auth_token, 2)
+        self.put_cart_position(self.other_buyer_auth_token, 1)
+        StockReservation.objects.filter(user=self.buyer).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(1, release_expired_stock())
+        self.product_card.refresh_from_db()
+        self.assertEqual(4, self.product_card.quantity)
+        self.assertEqual(1, StockReservation.objects.count())
+
+    def import_quantity(self, quantity):
+        good = {'id': 4244124, 'category': 224, 'model': 'apple/iphone/xr', 'name': self.product_card.product.name,
+                'price': Decimal('65000'), 'price_rrc': Decimal('69990'), 'quantity': quantity}
+        PriceListImporter(self.product_card.shop).run([{'id': 224, 'name': 'Смартфоны'}], [good])
+        self.product_card.refresh_from_db()
+
+    def test_import_keeps_holds_out_of_quantity(self):
+        self.put_cart_position(self.buyer_auth_token, 3)
+        self.import_quantity(10)
+        self.assertEqual(7, self.product_card.quantity)
+        self.assertEqual((7, 3), CatalogueEntry.objects.filter(product_card=self.product_card).
+                         values_list('quantity', 'reserved').get())
+        release_stock(self.buyer)
+        self.product_card.refresh_from_db()
+        self.assertEqual(10, self.product_card.quantity)
+
+    def test_import_trims_holds_above_quantity(self):
+        self.put_cart_position(self.buyer_auth_token, 2)
+        self.put_cart_position(self.other_buyer_auth_token, 2)
+        self.import_quantity(3)
+        self.assertEqual((0, 'sold'), (self.product_card.quantity, self.product_card.status))
+        self.assertEqual([(self.buyer.id, 2), (self.other_buyer.id, 1)],
+                         list(StockReservation.objects.order_by('id').values_list('user_id', 'quantity')))
+        release_stock(self.buyer)
+        release_stock(self.other_buyer)
+        self.product_card.refresh_from_db()
+        self.assertEqual(3, self.product_card.quantity)
+
+    def test_post_order_converts_reservation(self):
+        self.put_cart_position(self.buyer_auth_token, 5)
+        response = self.client.post(reverse('buyer:orders'), headers={'Authorization': f'Token {self.buyer_auth_token}'},
+                                    data=ORDER_DATA, format='json')
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.product_card.refresh_from_db()
+        self.assertEqual(0, self.product_card.quantity)
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(5, Order.objects.get(user=self.buyer).positions.get().quantity)
+
+
+class ConcurrentCheckoutTest(TransactionTestCase):
+    buyers_count = 5
+
+    def setUp(self):
+        self.product_card = create_product_card(quantity=3)
+        self.tokens = []
+        for number in range(self.buyers_count):
+            buyer, token = create_buyer(number)
+            CartPosition.objects.create(user=buyer, product_card=self.product_card, quantity=1)
+            self.tokens.append(token)
+
+    def checkout(self):
+        barrier = Barrier(self.buyers_count)
+        statuses = []
+
+        def post_order(token):
+            client = APIClient()
+            barrier.wait()
+            response = client.post(reverse('buyer:orders'), headers={'Authorization': f'Token {token}'},
+                                   data=ORDER_DATA, format='json')
+            statuses.append(response.status_code)
+            connection.close()
+
+        threads = [Thread(target=post_order, args=(token,)) for token in self.tokens]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def assert_not_oversold(self, statuses):
+        self.product_card.refresh_from_db()
+        self.assertEqual(3, statuses.count(status.HTTP_201_CREATED))
+        self.assertEqual(3, Order.objects.count())
+        self.assertEqual(0, self.product_card.quantity)
+        self.assertEqual('sold', self.product_card.status)
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_checkout(self):
+        self.assert_not_oversold(self.checkout())
+
+    @skipUnlessDBFeature('has_select_for_update')
+    @override_settings(STOCK_RESERVATION_ENABLED=True)
+    def test_concurrent_checkout_with_reservations(self):
+        self.assert_not_oversold(self.checkout())
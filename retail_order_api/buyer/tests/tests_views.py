@@ -7,8 +7,9 @@ import json
 from rest_framework.authtoken.models import Token
 from django.test import Client
 from decimal import Decimal
+from datetime import timedelta
 
-from products.models import ProductCard
+from products.models import ProductCard, Product
 from buyer.models import CartPosition
 from buyer.models import Order, Address, OrderPosition
 
@@ -83,6 +84,19 @@ class CartViewTest(APITestCase):
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertEqual(0, len(response.json()))
 
+    def test_get_cart_clamps_quantity_to_stock(self):
+        cart_position = next(position for position in self.cart if position.product_card.status == 'in_stock')
+        ProductCard.objects.filter(id=cart_position.product_card.id).update(quantity=1)
+        response = self.client.get(self.url,
+                                   headers={'Authorization': f'Token {self.buyer_auth_token}'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        position = next(position for position in response.json()['available_positions']
+                        if position['product_card'] == cart_position.product_card.id)
+        self.assertEqual(1, position['quantity'])
+        self.assertEqual(str(cart_position.product_card.price), position['price_per_quantity'])
+        cart_position.refresh_from_db()
+        self.assertEqual(1, cart_position.quantity)
+
     def test_delete_cart_with_correct_token(self):
         response = self.client.delete(self.url,
                                       headers={'Authorization': f'Token {self.buyer_auth_token}'})
@@ -437,18 +451,46 @@ class OrdersViewTest(APITestCase):
             {
                 "id": order_2.id,
                 "created_at": order_2.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-                "status": "new"
+                "status": "new",
+                "total": str(order_2_position_1.price_per_quantity)
             },
             {
                 "id": order_1.id,
                 "created_at": order_1.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-                "status": "new"
+                "status": "new",
+                "total": str(order_1_position_1.price_per_quantity + order_1_position_2.price_per_quantity)
             }
         ]
         response = self.client.get(self.url,
                                    headers={'Authorization': f'Token {self.buyer_auth_token}'})
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(expected_response, response.json())
+        self.assertEqual(expected_response, response.json()['results'])
+        response = self.client.get(self.url, data={'page_size': 1},
+                                   headers={'Authorization': f'Token {self.buyer_auth_token}'})
+        self.assertEqual(expected_response[:1], response.json()['results'])
+        response = self.client.get(response.json()['next'],
+                                   headers={'Authorization': f'Token {self.buyer_auth_token}'})
+        self.assertEqual(expected_response[1:], response.json()['results'])
+
+    def test_get_orders_filtered_by_date_and_status(self):
+        address = Address.objects.create(user=self.buyer, city='Moscow', street='Nevskogo', house='16')
+        order_data = {'user': self.buyer, 'address': address, 'first_name': 'Maksim', 'last_name': 'Maksimov',
+                      'phone': '89372773838'}
+        old_order = Order.objects.create(**order_data)
+        Order.objects.filter(id=old_order.id).update(created_at=old_order.created_at - timedelta(days=10))
+        canceled_order = Order.objects.create(**order_data, status='canceled')
+        new_order = Order.objects.create(**order_data)
+        today = new_order.created_at.date()
+        headers = {'Authorization': f'Token {self.buyer_auth_token}'}
+        response = self.client.get(self.url, data={'from': today, 'to': today}, headers=headers)
+        self.assertEqual([new_order.id, canceled_order.id], [order['id'] for order in response.json()['results']])
+        response = self.client.get(self.url, data={'data': today, 'status': 'new'}, headers=headers)
+        self.assertEqual([new_order.id], [order['id'] for order in response.json()['results']])
+        response = self.client.get(self.url, data={'to': today - timedelta(days=1)}, headers=headers)
+        self.assertEqual([old_order.id], [order['id'] for order in response.json()['results']])
+        self.assertEqual('0.00', response.json()['results'][0]['total'])
+        response = self.client.get(self.url, data={'from': today, 'to': today - timedelta(days=1)}, headers=headers)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
 
     def test_get_orders_with_wrong_token(self):
         response = self.client.get(self.url,
@@ -471,7 +513,7 @@ class OrdersViewTest(APITestCase):
         response = self.client.get(self.url,
                                    headers={'Authorization': f'Token {self.buyer_auth_token}'})
         self.assertEqual(status.HTTP_200_OK, response.status_code)
-        self.assertEqual(0, len(response.json()))
+        self.assertEqual(0, len(response.json()['results']))
 
     def test_post_order_with_new_address(self):
         self.fill_cart()
@@ -564,6 +606,54 @@ class OrdersViewTest(APITestCase):
         self.assertEqual('Empty cart.', response.json()['detail'])
         self.assertEqual(0, len(orders))
 
+    def test_post_order_takes_stock(self):
+        self.fill_cart()
+        quantities = {position.product_card_id: position.product_card.quantity - position.quantity
+                      for position in self.buyer.cart_positions.select_related('product_card')}
+        response = self.client.post(self.url,
+                                    data=self.get_order_data(), format='json',
+                                    headers={'Authorization': f'Token {self.buyer_auth_token}'})
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        for product_card in ProductCard.objects.filter(id__in=quantities):
+            self.assertEqual(quantities[product_card.id], product_card.quantity)
+        self.assertEqual(0, self.buyer.cart_positions.count())
+        for position in OrderPosition.objects.filter(order_id=response.json()['id']).select_related('product_card'):
+            self.assertEqual(position.product_card.shop_id, position.shop_id)
+
+    def test_get_orders_not_modified(self):
+        headers = {'Authorization': f'Token {self.buyer_auth_token}'}
+        response = self.client.get(self.url, headers=headers)
+        etag = response.headers['ETag']
+        self.assertIn('private', response.headers['Cache-Control'])
+        response = self.client.get(self.url, headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        self.fill_cart()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, data=self.get_order_data(), format='json', headers=headers)
+        response = self.client.get(self.url, headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(1, len(response.json()['results']))
+
+    def test_post_order_with_insufficient_stock(self):
+        self.fill_cart()
+        position = self.buyer.cart_positions.select_related('product_card').first()
+        product_card = position.product_card
+        product_card.quantity = 1
+        product_card.save()
+        response = self.client.post(self.url,
+                                    data=self.get_order_data(), format='json',
+                                    headers={'Authorization': f'Token {self.buyer_auth_token}'})
+        self.assertEqual(status.HTTP_409_CONFLICT, response.status_code)
+        expected_response = {'detail': 'Insufficient stock.',
+                             'items': [{'product_card': product_card.id,
+                                        'requested': position.quantity,
+                                        'available': 1}]}
+        self.assertEqual(expected_response, response.json())
+        self.assertEqual(0, Order.objects.filter(user=self.buyer).count())
+        self.assertEqual(2, self.buyer.cart_positions.count())
+        product_card.refresh_from_db()
+        self.assertEqual(1, product_card.quantity)
+
 
 class OrderDetailViewTest(APITestCase):
 
@@ -623,6 +713,37 @@ class OrderDetailViewTest(APITestCase):
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertEqual(expected_response, response.json())
 
+    def test_get_order_not_modified(self):
+        url = reverse('buyer:order_detail', kwargs={'pk': self.order.id})
+        headers = {'Authorization': f'Token {self.buyer_auth_token}'}
+        etag = self.client.get(url, headers=headers).headers['ETag']
+        response = self.client.get(url, headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        updated_at = Order.objects.get(id=self.order.id).updated_at
+        Order.objects.filter(id=self.order.id).update(status='confirmed',
+                                                      updated_at=updated_at + timedelta(microseconds=1))
+        response = self.client.get(url, headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('confirmed', response.json()['status'])
+
+    def test_get_large_order_in_fixed_number_of_queries(self):
+        product_card = ProductCard.objects.select_related('product').first()
+        products = Product.objects.bulk_create([Product(name=f'Product {number}', category=product_card.product.category)
+                                                for number in range(500)])
+        product_cards = ProductCard.objects.bulk_create([
+            ProductCard(product_code=number, model='model', product=product, shop=product_card.shop,
+                        price=Decimal('100'), price_rrc=Decimal('110'), quantity=10)
+            for number, product in enumerate(products)])
+        order = Order.objects.create(user=self.order.user, address=self.address, first_name='Maksim',
+                                     last_name='Maksimov', phone='89372773838')
+        OrderPosition.objects.bulk_create([OrderPosition(order=order, product_card=card, price=card.price, quantity=1)
+                                           for card in product_cards])
+        url = reverse('buyer:order_detail', args=[order.id])
+        with self.assertNumQueries(4):
+            response = self.client.get(url, headers={'Authorization': f'Token {self.buyer_auth_token}'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(500, len(response.json()['positions']))
+
     def test_get_order_with_incorrect_pk(self):
         url = reverse('buyer:order_detail', kwargs={'pk': 453})
         response = self.client.get(url,
@@ -5,23 +5,63 @@ from django.http import JsonResponse, HttpResponse
 from rest_framework import status, serializers
 from decimal import Decimal
 from django.db.utils import IntegrityError
+from django.db import transaction
+from django.db.models import (Q, F, Case, When, Value, Sum, Window, Subquery, OuterRef,
+                              ExpressionWrapper, BooleanField, DecimalField)
+from django.db.models.functions import Least, Coalesce
+from django.utils import timezone
+from datetime import datetime, time, timedelta
 from django.contrib.auth import get_user_model
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from drf_spectacular.utils import extend_schema, OpenApiResponse
 
 from .permissions import IsBuyer, IsOwner
 from .models import CartPosition, Order, OrderPosition, Address
 from products.models import ProductCard
+from products.stock import take_stock
+from products.catalogue import refresh_catalogue
+from .reservations import reservations_enabled, hold_stock, release_stock, convert_reservations
+from products.exceptions import InsufficientStockError
 from .serializers import (CartPositionSerializer, CartSerializer,
                           CartPositionDeleteSerializer,
-                          OrderSerializer, OrderListSerializer, AddressSerializer, OrderNewSerializer)
-from .signals import new_order
+                          OrderSerializer, AddressSerializer, OrderNewSerializer,
+                          InsufficientStockSerializer, OrderFilterSerializer, OrderListPageSerializer)
+from .signals import new_order, bump_order_versions
+from .pagination import OrderCursorPagination
+from .queries import get_order_detail
 from .exceptions import LimitError
 from retail_order_api.docs_responses import (response_unauthorized, DetailResponseSerializer,
                                              IncorrectDataSerializer)
+from retail_order_api.versions import get_etag
 
 
 User = get_user_model()
 
+def get_day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def get_orders_etag(request, *args, **kwargs):
+    return get_etag(request, f'orders:user:{request.user.id}')
+
+
+def get_order_last_modified(request, pk, *args, **kwargs):
+    # Looked up once for both the ETag and Last-Modified of the request.
+    if not hasattr(request, 'order_updated_at'):
+        request.order_updated_at = (Order.objects.filter(pk=pk, user=request.user).
+                                    values_list('updated_at', flat=True).first())
+    return request.order_updated_at
+
+
+def get_order_etag(request, pk, *args, **kwargs):
+    # updated_at keeps its microseconds here, unlike in Last-Modified.
+    updated_at = get_order_last_modified(request, pk)
+    if updated_at is not None:
+        return get_etag(request, f'orders:user:{request.user.id}', stamp=updated_at)
+
+
 responses_no_access = {**response_unauthorized,
                        status.HTTP_403_FORBIDDEN: OpenApiResponse(response=DetailResponseSerializer,
                                                                   description='The user is not a buyer.'),
@@ -39,27 +79,52 @@ class BuyerAPIView(APIView):
 @extend_schema(tags=["buyer’s cart"])
 class CartView(BuyerAPIView):
 
+    def get_cart(self):
+        """
+        Annotates every position with its availability, the quantity clamped
+        to the stock and the cart total, so the summary is a single query.
+        """
+        if reservations_enabled():
+            available = ~Q(product_card__status='withdrawn')
+            quantity = F('quantity')
+        else:
+            available = Q(product_card__status='in_stock')
+            quantity = Least(F('quantity'), F('product_card__quantity'))
+        cost = ExpressionWrapper(F('product_card__price') * F('available_quantity'), output_field=DecimalField())
+        return (self.user.cart_positions.all().select_related('product_card').
+                annotate(available=ExpressionWrapper(available, output_field=BooleanField()),
+                         available_quantity=quantity).
+                annotate(total=Window(Sum(Case(When(available, then=cost), default=Value(0),
+                                               output_field=DecimalField())))).
+                order_by('id'))
+
+    def clamp_quantities(self, positions):
+        stock = ProductCard.objects.filter(id=OuterRef('product_card_id')).values('quantity')[:1]
+        (self.user.cart_positions.filter(id__in=[position.id for position in positions]).
+         update(quantity=Least(F('quantity'), Subquery(stock))))
+
     @extend_schema(
         responses={status.HTTP_200_OK: CartSerializer,
                    **responses_no_access}
     )
     def get(self, request):
-        cart = self.user.cart_positions.all().select_related('product_card')
+        cart = list(self.get_cart())
         if not cart:
             return JsonResponse(data={})
         unavailable_positions = []
         available_positions = []
-        total_available_positions = 0
+        clamped_positions = []
         for position in cart:
-            product_card = position.product_card
-            if product_card.status in ['withdrawn', 'sold']:
+            if not position.available:
                 unavailable_positions.append(position)
                 continue
-            if position.quantity > product_card.quantity:
-                position.quantity = product_card.quantity
-                position.save()
+            if position.quantity != position.available_quantity:
+                position.quantity = position.available_quantity
+                clamped_positions.append(position)
             available_positions.append(position)
-            total_available_positions += position.price_per_quantity
+        if clamped_positions:
+            self.clamp_quantities(clamped_positions)
+        total_available_positions = cart[0].total or Decimal('0.00')
         serializer = CartSerializer({
             'available_positions': available_positions,
             'unvailable_positions': unavailable_positions,
@@ -74,7 +139,10 @@ class CartView(BuyerAPIView):
                    **responses_no_access}
     )
     def delete(self, request):
-        cart = self.user.cart_positions.all().delete()
+        with transaction.atomic():
+            cart = self.user.cart_positions.all().delete()
+            if reservations_enabled():
+                release_stock(self.user)
         return HttpResponse(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -90,13 +158,20 @@ class CartPositionView(BuyerAPIView):
                    **responses_no_access}
     )
     def put(self, request):
-        serializer = CartPositionSerializer(data=request.data)
+        serializer = CartPositionSerializer(data=request.data, context={'check_stock': not reservations_enabled()})
         serializer.is_valid(raise_exception=True)
         validated_data = serializer.validated_data
-        cart_position, created = CartPosition.objects.update_or_create(
-            user=self.user,
-            product_card=validated_data['product_card'],
-            defaults={'quantity': validated_data['quantity']})
+        try:
+            with transaction.atomic():
+                if reservations_enabled():
+                    hold_stock(self.user, validated_data['product_card'], validated_data['quantity'])
+                cart_position, created = CartPosition.objects.update_or_create(
+                    user=self.user,
+                    product_card=validated_data['product_card'],
+                    defaults={'quantity': validated_data['quantity']})
+        except InsufficientStockError:
+            return JsonResponse({'non_field_errors': ['Quantity exceeds the actual stock of the product.']},
+                                status=status.HTTP_400_BAD_REQUEST)
         if created:
             return HttpResponse(status=status.HTTP_201_CREATED)
         else:
@@ -123,25 +198,43 @@ class CartPositionView(BuyerAPIView):
                 {"detail": f"Product card with id '{product_card.id}' "
                            f"is not in the cart."},
                 status=status.HTTP_404_NOT_FOUND)
-        cart_position.delete()
+        with transaction.atomic():
+            cart_position.delete()
+            if reservations_enabled():
+                release_stock(self.user, [product_card.id])
         return HttpResponse(status=status.HTTP_204_NO_CONTENT)
 
 
 @extend_schema(tags=["buyer’s orders"])
 class OrdersView(BuyerAPIView):
 
+    def get_orders(self, filters):
+        orders = Order.objects.filter(user=self.user)
+        if filters.get('from'):
+            orders = orders.filter(created_at__gte=get_day_start(filters['from']))
+        if filters.get('to'):
+            orders = orders.filter(created_at__lt=get_day_start(filters['to'] + timedelta(days=1)))
+        if filters.get('status'):
+            orders = orders.filter(status__in=filters['status'])
+        totals = (OrderPosition.objects.filter(order=OuterRef('pk')).values('order').
+                  annotate(total=Sum(F('price') * F('quantity'))).values('total'))
+        return orders.annotate(total=Coalesce(Subquery(totals), Value(Decimal('0.00')),
+                                              output_field=DecimalField()))
+
     @extend_schema(
-        responses={status.HTTP_200_OK: OrderListSerializer(many=True),
+        parameters=[OrderFilterSerializer],
+        responses={status.HTTP_200_OK: OrderListPageSerializer,
                    **responses_no_access}
     )
+    @method_decorator(cache_control(private=True, no_cache=True))
+    @method_decorator(condition(etag_func=get_orders_etag))
     def get(self, request):
-        data = request.query_params.get('data')
-        if data:
-            orders = Order.objects.filter(user=self.user, created_at__startswith=data).order_by('-created_at')
-        else:
-            orders = Order.objects.filter(user=self.user).order_by('-created_at')
-        serializer = OrderListSerializer(orders, many=True)
-        return JsonResponse(serializer.data, safe=False)
+        filter_serializer = OrderFilterSerializer(data=request.query_params)
+        filter_serializer.is_valid(raise_exception=True)
+        orders = self.get_orders(filter_serializer.validated_data)
+        page = OrderCursorPagination().get_page(orders, request, view=self)
+        serializer = OrderListPageSerializer(page)
+        return JsonResponse(serializer.data)
 
     def update_or_create_address(self, address):
         address, created = Address.objects.update_or_create(
@@ -150,36 +243,47 @@ class OrdersView(BuyerAPIView):
         return address
 
     def get_cart_positions(self):
-        cart_positions = (self.user.cart_positions.filter(product_card__status='in_stock').
-                          select_related('product_card'))
-        return cart_positions
+        if reservations_enabled():
+            cart_positions = self.user.cart_positions.exclude(product_card__status='withdrawn')
+        else:
+            cart_positions = self.user.cart_positions.filter(product_card__status='in_stock')
+        return cart_positions.select_related('product_card')
+
+    def take_stock(self, cart_positions):
+        quantities = {position.product_card_id: position.quantity for position in cart_positions}
+        if reservations_enabled():
+            convert_reservations(self.user, quantities)
+            product_cards = {position.product_card_id: position.product_card for position in cart_positions}
+        else:
+            product_cards = take_stock(quantities)
+        refresh_catalogue(quantities)
+        return product_cards
 
     def create_order(self, address, validated_data):
         order = Order(user=self.user, address=address, **validated_data)
         order.save()
         return order
 
-    def get_order_positions(self, order, cart_positions):
+    def get_order_positions(self, order, cart_positions, product_cards):
         order_positions = []
         for position in cart_positions:
-            product_card = position.product_card
+            product_card = product_cards[position.product_card_id]
             order_position = OrderPosition(order=order,
                                            product_card=product_card,
+                                           shop_id=product_card.shop_id,
                                            price=product_card.price,
                                            quantity=position.quantity
                                            )
             order_positions.append(order_position)
-            product_card.quantity -= position.quantity
-            position.delete()
-            product_card.save(update_fields=['quantity', 'status'])
         return order_positions
 
     @extend_schema(
         request=OrderSerializer,
         responses={status.HTTP_201_CREATED: OrderNewSerializer,
                    status.HTTP_409_CONFLICT: OpenApiResponse(
-                       response=DetailResponseSerializer,
-                       description='No more than 5 addresses per user or cart is empty.'),
+                       response=InsufficientStockSerializer,
+                       description='No more than 5 addresses per user, cart is empty '
+                                   'or the stock is insufficient for the listed items.'),
                    status.HTTP_400_BAD_REQUEST: OpenApiResponse(response=IncorrectDataSerializer,
                                                                 description='Incorrect data.'),
                    **responses_no_access}
@@ -189,15 +293,21 @@ class OrdersView(BuyerAPIView):
         serializer.is_valid(raise_exception=True)
         validated_data = serializer.validated_data
         try:
-            address = self.update_or_create_address(address=validated_data.pop('address'))
+            with transaction.atomic():
+                address = self.update_or_create_address(address=validated_data.pop('address'))
+                cart_positions = list(self.get_cart_positions())
+                if not cart_positions:
+                    return JsonResponse({'detail': 'Empty cart.'}, status=status.HTTP_409_CONFLICT)
+                product_cards = self.take_stock(cart_positions)
+                order = self.create_order(address=address, validated_data=validated_data)
+                OrderPosition.objects.bulk_create(self.get_order_positions(order, cart_positions, product_cards))
+                CartPosition.objects.filter(id__in=[position.id for position in cart_positions]).delete()
         except LimitError as err:
             return JsonResponse({'detail': f'{err}'}, status=status.HTTP_409_CONFLICT)
-        cart_positions = self.get_cart_positions()
-        if not cart_positions:
-            return JsonResponse({'detail': 'Empty cart.'}, status=status.HTTP_409_CONFLICT)
-        order = self.create_order(address=address, validated_data=validated_data)
-        order_positions = self.get_order_positions(order, cart_positions)
-        OrderPosition.objects.bulk_create(order_positions)
+        except InsufficientStockError as err:
+            serializer = InsufficientStockSerializer({'detail': f'{err}', 'items': err.items})
+            return JsonResponse(serializer.data, status=status.HTTP_409_CONFLICT)
+        bump_order_versions(order)
         new_order.send(sender=self.__class__, order=order, buyer_email=self.user.email)
         serializer = OrderNewSerializer(order)
         return JsonResponse(serializer.data, status=status.HTTP_201_CREATED)
@@ -213,8 +323,10 @@ class OrderView(BuyerAPIView):
                      description='Order not found.'),
                  **responses_no_access}
     )
+    @method_decorator(cache_control(private=True, no_cache=True))
+    @method_decorator(condition(etag_func=get_order_etag, last_modified_func=get_order_last_modified))
     def get(self, request, pk):
-        order = get_object_or_404(Order, pk=pk)
+        order = get_object_or_404(get_order_detail(), pk=pk)
         self.check_object_permissions(request, obj=order)
         serializer = OrderSerializer(order)
         return JsonResponse(serializer.data)
@@ -0,0 +1,95 @@
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from products.stock import return_stock
+from products.catalogue import refresh_catalogue
+from retail_order_api.versions import bump_versions
+from retail_order_api.dispatch import dispatch
+from seller.models import Shop
+from .models import Order, OrderPosition
+from .tasks import send_order_status_notifications_task
+
+
+TRANSITIONS = {
+    'new': ('confirmed', 'canceled'),
+    'confirmed': ('assembled', 'canceled'),
+    'assembled': ('sent', 'canceled'),
+    'sent': ('delivered',),
+    'delivered': (),
+    'canceled': (),
+}
+BATCH_SIZE = 1000
+NOTIFICATION_BATCH_SIZE = 500
+
+
+def get_source_statuses(status):
+    return [source for source, targets in TRANSITIONS.items() if status in targets]
+
+
+def can_transition(source, status):
+    return status in TRANSITIONS.get(source, ())
+
+
+def restock_orders(orders_ids):
+    """
+    Returns the quantities of the orders' positions to the stock through
+    the same locked UPDATE the checkout takes it with.
+    Must be called inside a transaction.
+    """
+    quantities = dict(OrderPosition.objects.filter(order_id__in=orders_ids).order_by().
+                      values('product_card_id').annotate(quantity=Sum('quantity')).
+                      values_list('product_card_id', 'quantity'))
+    return_stock(quantities)
+    refresh_catalogue(list(quantities))
+
+
+def bump_orders_versions(orders_ids):
+    users_ids = Order.objects.filter(id__in=orders_ids).values_list('user_id', flat=True).distinct()
+    sellers_ids = (Shop.objects.filter(order_positions__order_id__in=orders_ids).
+                   values_list('user_id', flat=True).distinct())
+    bump_versions([*[f'orders:user:{user_id}' for user_id in users_ids],
+                   *[f'orders:seller:{seller_id}' for seller_id in sellers_ids]])
+
+
+def notify_orders(orders_ids, status):
+    for start in range(0, len(orders_ids), NOTIFICATION_BATCH_SIZE):
+        batch = orders_ids[start:start + NOTIFICATION_BATCH_SIZE]
+        dispatch(send_order_status_notifications_task, batch, status)
+
+
+def get_shared_orders(orders_ids, shop):
+    return set(OrderPosition.objects.filter(order_id__in=orders_ids).exclude(shop=shop).
+               values_list('order_id', flat=True))
+
+
+def transition_orders(orders, status, shop=None):
+    """
+    Moves the orders of the queryset that may go to the status with one
+    UPDATE per batch and returns the ids of the moved orders together with
+    the current status and the refusal reason of the others. With a shop,
+    orders that also hold positions of other shops are refused, since their
+    status is not the shop's alone. Cancelled orders are restocked,
+    delivered orders get delivered_at, and the buyers are notified in
+    batches once the transaction commits.
+    """
+    sources = get_source_statuses(status)
+    with transaction.atomic():
+        current = dict(orders.select_for_update().order_by('id').values_list('id', 'status'))
+        shared = get_shared_orders(list(current), shop) if shop is not None else set()
+        moved = [order_id for order_id, source in current.items() if source in sources and order_id not in shared]
+        refused = {order_id: {'status': source, 'reason': 'shared' if order_id in shared else 'transition'}
+                   for order_id, source in current.items() if source not in sources or order_id in shared}
+        if not moved:
+            return moved, refused
+        if status == 'canceled':
+            restock_orders(moved)
+        now = timezone.now()
+        values = {'status': status, 'updated_at': now}
+        if status == 'delivered':
+            values['delivered_at'] = now
+        for start in range(0, len(moved), BATCH_SIZE):
+            Order.objects.filter(id__in=moved[start:start + BATCH_SIZE]).update(**values)
+        bump_orders_versions(moved)
+        notify_orders(moved, status)
+    return moved, refused
@@ -0,0 +1,31 @@
+from django.db import models
+from django.utils import timezone
+
+
+STATUS_CHOICES = (
+    ('queued', 'Queued'),
+    ('sending', 'Sending'),
+    ('sent', 'Sent'),
+    ('failed', 'Failed'),
+)
+
+
+class OutboundEmail(models.Model):
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=254, blank=True, null=True)
+    to = models.JSONField(default=list)
+    attachments = models.JSONField(default=list, blank=True)
+    status = models.CharField(choices=STATUS_CHOICES, max_length=7, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_at'], condition=models.Q(status__in=('queued', 'sending')),
+                         name='email_queued_idx'),
+        ]
@@ -0,0 +1,173 @@
+from time import monotonic, sleep
+from datetime import timedelta
+from uuid import uuid4
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from retail_order_api.dispatch import dispatch
+from .models import OutboundEmail
+
+
+DRAIN_LOCK_KEY = 'mailer:drain'
+
+def queue_emails(emails):
+    """
+    Stores the OutboundEmail instances and dispatches a drain of the outbox
+    once the current transaction commits.
+    """
+    from .tasks import drain_outbox_task
+
+    emails = OutboundEmail.objects.bulk_create(emails, batch_size=1000)
+    if emails:
+        dispatch(drain_outbox_task)
+    return emails
+
+
+def queue_email(subject, body, to, html_body='', attachments=()):
+    return queue_emails([OutboundEmail(subject=subject, body=body, html_body=html_body,
+                                       from_email=settings.EMAIL_HOST_USER, to=list(to),
+                                       attachments=list(attachments))])[0]
+
+
+def build_message(email, connection):
+    message = EmailMultiAlternatives(email.subject, email.body, email.from_email, email.to,
+                                     connection=connection)
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    for attachment in email.attachments:
+        message.attach(attachment['filename'], attachment['content'], attachment['mimetype'])
+    return message
+
+
+def get_retry_delay(attempts):
+    return timedelta(seconds=settings.MAILER_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+class RateLimiter:
+    """
+    Spaces the calls to wait() so that no more than rate of them pass per second.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_at = monotonic()
+
+    def wait(self):
+        delay = self.next_at - monotonic()
+        if delay > 0:
+            sleep(delay)
+        self.next_at = max(self.next_at, monotonic()) + self.interval
+
+
+def claim_batch(batch_size):
+    """
+    Marks a batch of due messages as sending in a short transaction and
+    returns them. The claim lasts MAILER_CLAIM_TIMEOUT seconds, after which
+    the messages a crashed drain left unsent are due again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(OutboundEmail.objects.select_for_update(skip_locked=True).
+                      filter(status__in=('queued', 'sending'), next_attempt_at__lte=now).
+                      order_by('next_attempt_at', 'id')[:batch_size])
+        (OutboundEmail.objects.filter(id__in=[email.id for email in emails]).
+         update(status='sending', next_attempt_at=now + timedelta(seconds=settings.MAILER_CLAIM_TIMEOUT)))
+    return emails
+
+
+def record_sent(email):
+    email.status = 'sent'
+    email.sent_at = timezone.now()
+    email.last_error = ''
+    OutboundEmail.objects.filter(id=email.id).update(status=email.status, attempts=email.attempts,
+                                                     sent_at=email.sent_at, last_error=email.last_error)
+
+
+def record_failure(email, exc):
+    email.last_error = f'{exc}'
+    if email.attempts >= settings.MAILER_MAX_ATTEMPTS:
+        email.status = 'failed'
+    else:
+        email.status = 'queued'
+        email.next_attempt_at = timezone.now() + get_retry_delay(email.attempts)
+    OutboundEmail.objects.filter(id=email.id).update(status=email.status, attempts=email.attempts,
+                                                     next_attempt_at=email.next_attempt_at,
+                                                     last_error=email.last_error)
+
+
+def send_batch(emails, connection, limiter):
+    """
+    Sends the claimed emails one by one and records each result as soon as
+    it is known. When the connection cannot be opened, the rest of the batch
+    is recorded as failed with a backoff and unreachable is returned true.
+    Returns the sent and failed counts and unreachable.
+    """
+    sent = failed = 0
+    for number, email in enumerate(emails):
+        try:
+            connection.open()
+        except Exception as exc:
+            for pending in emails[number:]:
+                pending.attempts += 1
+                record_failure(pending, exc)
+            return sent, failed + len(emails) - number, True
+        limiter.wait()
+        email.attempts += 1
+        try:
+            connection.send_messages([build_message(email, connection)])
+        except Exception as exc:
+            connection.close()
+            record_failure(email, exc)
+            failed += 1
+        else:
+            record_sent(email)
+            sent += 1
+    return sent, failed, False
+
+
+def drain_outbox(limit=None):
+    """
+    Sends the due queued emails in batches of MAILER_BATCH_SIZE over a single
+    connection, at most MAILER_RATE_LIMIT messages per second. Each batch is
+    claimed in its own short transaction and sent outside of it, so a crash
+    can only repeat the message being sent. A failed message, or a whole
+    batch when the relay is unreachable, is retried with an exponential
+    backoff until MAILER_MAX_ATTEMPTS is reached. Returns the sent and
+    failed counts.
+
+    Only one drain runs at a time across the workers, so the rate limit
+    holds globally: a drain started while another one holds the cache lock
+    returns at once, leaving the new messages to the running drain, which
+    goes on until the outbox is empty, or to the next periodic drain.
+    """
+    sent_count = failed_count = 0
+    token = uuid4().hex
+    if not cache.add(DRAIN_LOCK_KEY, token, settings.MAILER_CLAIM_TIMEOUT):
+        return sent_count, failed_count
+    limiter = RateLimiter(settings.MAILER_RATE_LIMIT)
+    connection = None
+    try:
+        while limit is None or sent_count + failed_count < limit:
+            cache.touch(DRAIN_LOCK_KEY, settings.MAILER_CLAIM_TIMEOUT)
+            batch_size = settings.MAILER_BATCH_SIZE
+            if limit is not None:
+                batch_size = min(batch_size, limit - sent_count - failed_count)
+            emails = claim_batch(batch_size)
+            if not emails:
+                break
+            if connection is None:
+                connection = get_connection()
+            sent, failed, unreachable = send_batch(emails, connection, limiter)
+            sent_count += sent
+            failed_count += failed
+            if unreachable:
+                break
+    finally:
+        if connection is not None:
+            connection.close()
+        if cache.get(DRAIN_LOCK_KEY) == token:
+            cache.delete(DRAIN_LOCK_KEY)
+    return sent_count, failed_count
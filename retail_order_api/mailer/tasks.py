@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from .outbox import drain_outbox
+
+
+@shared_task()
+def drain_outbox_task():
+    return drain_outbox()
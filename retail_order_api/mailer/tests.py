@@ -0,0 +1,104 @@
+from unittest import mock
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import OutboundEmail
+from .outbox import DRAIN_LOCK_KEY, queue_email, drain_outbox, RateLimiter
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', MAILER_BATCH_SIZE=2,
+                   MAILER_RATE_LIMIT=0, MAILER_MAX_ATTEMPTS=2, MAILER_RETRY_DELAY=60)
+class OutboxTest(TestCase):
+
+    def queue(self, count):
+        return [queue_email(f'Заказ {number}', f'Накладная по заказу {number}', [f'buyer{number}@gmail.com'],
+                            html_body=f'<p>Накладная по заказу {number}</p>',
+                            attachments=[{'filename': f'{number}.csv', 'content': 'id;quantity\n',
+                                          'mimetype': 'text/csv'}])
+                for number in range(count)]
+
+    def test_drain_outbox_over_one_connection(self):
+        self.queue(5)
+        with mock.patch('mailer.outbox.get_connection', wraps=mail.get_connection) as get_connection:
+            self.assertEqual((5, 0), drain_outbox())
+        self.assertEqual(1, get_connection.call_count)
+        self.assertEqual(5, len(mail.outbox))
+        self.assertEqual([('text/html', 'text/csv')] * 5,
+                         [(message.alternatives[0][1], message.attachments[0][2]) for message in mail.outbox])
+        self.assertFalse(OutboundEmail.objects.exclude(status='sent').exists())
+        self.assertEqual((0, 0), drain_outbox())
+
+    def test_one_drain_at_a_time(self):
+        self.queue(3)
+        cache.set(DRAIN_LOCK_KEY, 'other', 60)
+        self.addCleanup(cache.delete, DRAIN_LOCK_KEY)
+        self.assertEqual((0, 0), drain_outbox())
+        self.assertEqual(3, OutboundEmail.objects.filter(status='queued').count())
+        cache.delete(DRAIN_LOCK_KEY)
+        self.assertEqual((3, 0), drain_outbox())
+        self.assertIsNone(cache.get(DRAIN_LOCK_KEY))
+
+    def test_retry_with_backoff(self):
+        email, = self.queue(1)
+        with mock.patch.object(EmailBackend, 'send_messages', side_effect=OSError('Connection refused')):
+            self.assertEqual((0, 1), drain_outbox())
+        email.refresh_from_db()
+        self.assertEqual(('queued', 1, 'Connection refused'), (email.status, email.attempts, email.last_error))
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=59))
+        self.assertEqual((0, 0), drain_outbox())
+
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        with mock.patch.object(EmailBackend, 'send_messages', side_effect=OSError('Connection refused')):
+            self.assertEqual((0, 1), drain_outbox())
+        email.refresh_from_db()
+        self.assertEqual(('failed', 2), (email.status, email.attempts))
+        self.assertEqual([], mail.outbox)
+
+    def test_unreachable_relay_backs_off_batch(self):
+        self.queue(3)
+        with mock.patch.object(EmailBackend, 'open', side_effect=OSError('Connection refused')):
+            self.assertEqual((0, 2), drain_outbox())
+        self.assertEqual([('queued', 1, 'Connection refused'), ('queued', 1, 'Connection refused'),
+                          ('queued', 0, '')],
+                         list(OutboundEmail.objects.order_by('id').values_list('status', 'attempts', 'last_error')))
+        self.assertEqual(2, OutboundEmail.objects.filter(next_attempt_at__gt=timezone.now()).count())
+
+    def test_results_recorded_per_message(self):
+        self.queue(2)
+        sent = []
+
+        def send_messages(backend, messages):
+            self.assertEqual('sending', OutboundEmail.objects.get(subject=messages[0].subject).status)
+            self.assertEqual(len(sent), OutboundEmail.objects.filter(status='sent').count())
+            sent.extend(messages)
+            return len(messages)
+
+        with mock.patch.object(EmailBackend, 'send_messages', autospec=True, side_effect=send_messages):
+            self.assertEqual((2, 0), drain_outbox())
+        self.assertEqual(2, len(sent))
+
+    def test_expired_claim_is_sent_again(self):
+        email, = self.queue(1)
+        OutboundEmail.objects.update(status='sending', next_attempt_at=timezone.now() + timedelta(seconds=60))
+        self.assertEqual((0, 0), drain_outbox())
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual((1, 0), drain_outbox())
+        email.refresh_from_db()
+        self.assertEqual('sent', email.status)
+
+    def test_drain_outbox_limit(self):
+        self.queue(3)
+        self.assertEqual((1, 0), drain_outbox(limit=1))
+        self.assertEqual(2, OutboundEmail.objects.filter(status='queued').count())
+
+    def test_rate_limiter(self):
+        limiter = RateLimiter(4)
+        with mock.patch('mailer.outbox.sleep') as sleep:
+            for _ in range(3):
+                limiter.wait()
+        self.assertEqual(2, sleep.call_count)
+        self.assertAlmostEqual(0.5, sleep.call_args[0][0], delta=0.05)
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ProductsConfig(AppConfig):
@@ -7,3 +8,4 @@ class ProductsConfig(AppConfig):
 
     def ready(self):
         import products.signals
+        post_migrate.connect(products.signals.prepare_search_backend, sender=self)
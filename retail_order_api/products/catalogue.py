@@ -0,0 +1,118 @@
+from contextlib import contextmanager
+from threading import local
+from time import time_ns
+from django.db.models import Sum, Value, Prefetch, Subquery, OuterRef
+from django.db.models.functions import Coalesce
+
+from .models import ProductCard, ProductParameter, Image, CatalogueEntry
+from .thumbnails import get_manifest
+from .search import update_search_documents
+from buyer.models import StockReservation
+from retail_order_api.versions import bump_versions
+
+
+ENTRY_FIELDS = ('name', 'category', 'shop', 'description', 'price', 'quantity', 'reserved',
+                'parameters', 'images', 'image_urls', 'thumbnails', 'version')
+BATCH_SIZE = 1000
+deferred = local()
+
+
+def get_reserved():
+    reserved = (StockReservation.objects.filter(product_card=OuterRef('id')).
+                values('product_card').annotate(total=Sum('quantity')).values('total'))
+    return Coalesce(Subquery(reserved), Value(0))
+
+
+def get_sellable_cards(cards_ids):
+    return (ProductCard.objects.filter(id__in=cards_ids, status='in_stock', shop__open_for_orders=True).
+            select_related('product').
+            prefetch_related(
+                Prefetch('parameters', queryset=ProductParameter.objects.select_related('parameter')),
+                Prefetch('images', queryset=Image.objects.order_by('id'))).
+            annotate(reserved=get_reserved()))
+
+
+def build_entry(card, version, manifest):
+    return CatalogueEntry(
+        product_card=card,
+        name=card.product.name,
+        category_id=card.product.category_id,
+        shop_id=card.shop_id,
+        description=card.description,
+        price=card.price,
+        quantity=card.quantity,
+        reserved=card.reserved,
+        parameters=[{'parameter': parameter.parameter.name, 'value': parameter.value}
+                    for parameter in card.parameters.all()],
+        images=[image.id for image in card.images.all()],
+        image_urls=[image.image.url for image in card.images.all()],
+        thumbnails=[manifest.get(image.image.name, {}) for image in card.images.all()],
+        version=version,
+    )
+
+
+def refresh_catalogue(cards_ids):
+    """
+    Rebuilds the catalogue entries of the given cards: sellable cards are
+    upserted and the entries of the others are removed. Every refresh
+    gives the entries a new version, which keys their cached fragments.
+    """
+    cards_ids = list(cards_ids)
+    version = time_ns()
+    for start in range(0, len(cards_ids), BATCH_SIZE):
+        batch = cards_ids[start:start + BATCH_SIZE]
+        cards = list(get_sellable_cards(batch))
+        manifest = get_manifest([image.image.name for card in cards for image in card.images.all()])
+        entries = [build_entry(card, version, manifest) for card in cards]
+        CatalogueEntry.objects.bulk_create(
+            entries,
+            update_conflicts=True,
+            unique_fields=['product_card'],
+            update_fields=ENTRY_FIELDS
+        )
+        (CatalogueEntry.objects.filter(product_card_id__in=batch).
+         exclude(product_card_id__in=[entry.product_card_id for entry in entries]).delete())
+        shops_ids = set(ProductCard.objects.filter(id__in=batch).values_list('shop_id', flat=True))
+        bump_versions(['catalogue', *[f'catalogue:shop:{shop_id}' for shop_id in shops_ids]])
+
+
+def refresh_shop_catalogue(shop_id):
+    cards_ids = ProductCard.objects.filter(shop_id=shop_id).values_list('id', flat=True)
+    refresh_catalogue(cards_ids.iterator())
+
+
+@contextmanager
+def deferred_refresh():
+    """
+    Collects the refreshes requested by the signal receivers inside the
+    block and runs them once, in batches, when the outermost block exits
+    without an error.
+    """
+    if getattr(deferred, 'pending', None) is not None:
+        yield
+        return
+    deferred.pending = pending = {'catalogue': set(), 'search': set()}
+    try:
+        yield
+    finally:
+        deferred.pending = None
+    if pending['search']:
+        update_search_documents(pending['search'])
+    refresh_catalogue(pending['catalogue'])
+
+
+def request_refresh(cards_ids, search=False):
+    """
+    Refreshes the catalogue entries, and the search documents too if search
+    is set, of the given cards right away, or at the end of the enclosing
+    deferred_refresh block.
+    """
+    pending = getattr(deferred, 'pending', None)
+    if pending is None:
+        if search:
+            update_search_documents(cards_ids)
+        refresh_catalogue(cards_ids)
+        return
+    pending['catalogue'].update(cards_ids)
+    if search:
+        pending['search'].update(cards_ids)
@@ -0,0 +1,5 @@
+class InsufficientStockError(Exception):
+
+    def __init__(self, items):
+        super().__init__('Insufficient stock.')
+        self.items = items
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+from .serializers import CatalogueEntrySerializer
+
+
+renderer = JSONRenderer()
+
+
+def get_fragment_key(entry):
+    return f'catalogue:{entry.product_card_id}:{entry.version}'
+
+
+def render_entries(entries):
+    """
+    Returns the JSON array of the serialized entries assembled from cached
+    fragments. Only the entries missing from the cache are serialized.
+    The version in the key changes on every catalogue refresh, so stale
+    fragments are never read and simply expire.
+    """
+    keys = [get_fragment_key(entry) for entry in entries]
+    fragments = cache.get_many(keys)
+    missing = {key: entry for key, entry in zip(keys, entries) if key not in fragments}
+    if missing:
+        rendered = {key: renderer.render(data) for key, data
+                    in zip(missing, CatalogueEntrySerializer(missing.values(), many=True).data)}
+        cache.set_many(rendered, settings.CATALOGUE_FRAGMENT_TIMEOUT)
+        fragments.update(rendered)
+    return b'[' + b','.join(fragments[key] for key in keys) + b']'
+
+
+def render_page(entries, **data):
+    envelope = renderer.render(data)
+    return envelope[:-1] + b',"results":' + render_entries(entries) + b'}'
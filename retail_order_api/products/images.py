@@ -0,0 +1,124 @@
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from django.conf import settings
+import os
+from django.core.files.base import ContentFile
+from django.db import transaction
+from easy_thumbnails import engine, utils
+
+from retail_order_api.storage import get_field_thumbnailer, get_thumbnail_options, lock_content
+from retail_order_api.uploads import discard_staged, get_staged_path
+from .models import Image
+from .catalogue import deferred_refresh, refresh_catalogue
+from .thumbnails import pregenerate_thumbnails, record_thumbnails
+
+
+def save_thumbnails(thumbnailer, source, options):
+    thumbnails, timings = {}, {}
+    for alias, alias_options in options.items():
+        started = perf_counter()
+        image = engine.process_image(source, alias_options, thumbnailer.thumbnail_processors)
+        name = thumbnailer.get_thumbnail_name(alias_options, transparent=utils.is_transparent(image))
+        data = engine.save_pil_image(image, filename=name, quality=alias_options['quality'],
+                                     subsampling=alias_options['subsampling']).read()
+        thumbnailer.thumbnail_storage.delete(name)
+        thumbnailer.thumbnail_storage.save(name, ContentFile(data))
+        thumbnails[alias] = {'name': name, 'width': image.width, 'height': image.height}
+        timings[alias] = round(perf_counter() - started, 4)
+    return thumbnails, timings
+
+
+def process_upload(handle, upload_name):
+    """
+    Links one staged upload to its final name and writes the missing
+    product thumbnail aliases from a single decode of it. An upload whose
+    content is already stored with all its thumbnails is not decoded at all.
+    Runs in a pool process, so it touches the storage only, never the database;
+    the staged file is kept for ingest_images unless processing failed.
+    """
+    started = perf_counter()
+    result = {'staged': handle}
+    field = Image._meta.get_field('image')
+    try:
+        with open(get_staged_path(handle), 'rb') as file:
+            data = file.read()
+        read_time = perf_counter()
+        name = field.storage.get_content_name(upload_name, ContentFile(data))
+        thumbnailer = get_field_thumbnailer(field, name, file=ContentFile(data))
+        options = {alias: alias_options for alias, alias_options in get_thumbnail_options(thumbnailer).items()
+                   if not thumbnailer.get_existing_thumbnail(alias_options)}
+        source = None
+        if options:
+            source = engine.generate_source_image(thumbnailer, {}, thumbnailer.source_generators,
+                                                  fail_silently=False)
+            if source is None:
+                raise ValueError(f"The file does not appear to be an image: '{handle}'")
+        decode_time = perf_counter()
+        field.storage.link(get_staged_path(handle), name)
+        result['thumbnails'], timings = save_thumbnails(thumbnailer, source, options) if options else ({}, {})
+        result['name'] = name
+        result['timings'] = {'read': round(read_time - started, 4), 'decode': round(decode_time - read_time, 4),
+                             'thumbnails': timings, 'total': round(perf_counter() - started, 4)}
+    except Exception as exc:
+        result['error'] = f'{exc}'
+        discard_staged([handle])
+    return result
+
+
+def process_uploads(uploads, workers=None):
+    """
+    Processes the (staging handle, upload name) pairs in a pool of
+    IMAGE_PIPELINE_WORKERS processes; zero workers process them in place.
+    """
+    if workers is None:
+        workers = settings.IMAGE_PIPELINE_WORKERS
+    if workers == 0 or len(uploads) < 2:
+        return [process_upload(*upload) for upload in uploads]
+    with ProcessPoolExecutor(max_workers=min(workers, len(uploads))) as executor:
+        return list(executor.map(process_upload, *zip(*uploads)))
+
+
+def ingest_images(product_card, handles, workers=None):
+    """
+    Turns the staged uploads into images of the product card with their
+    thumbnails generated, inserts the Image rows with one query, records the
+    new thumbnails in the manifest and returns the per-image results with
+    their timings. The rows are inserted under the content lock, after
+    restoring from the staged uploads any content a concurrent delete removed
+    since it was processed.
+    """
+    field = Image._meta.get_field('image')
+    instance = Image(product_card=product_card)
+    uploads = [(handle, field.generate_filename(instance, f'{product_card.id}_{os.path.basename(handle)}'))
+               for handle in handles]
+    try:
+        results = process_uploads(uploads, workers)
+        stored = [result for result in results if 'name' in result]
+        with transaction.atomic():
+            lock_content([result['name'] for result in stored])
+            restored = {result['name'] for result in stored if not field.storage.exists(result['name'])}
+            for result in stored:
+                if result['name'] in restored:
+                    field.storage.link(get_staged_path(result['staged']), result['name'])
+            Image.objects.bulk_create([Image(product_card=product_card, image=result['name'])
+                                       for result in stored])
+            record_thumbnails({result['name']: result['thumbnails'] for result in stored
+                               if result['thumbnails'] and result['name'] not in restored})
+            for name in restored:
+                pregenerate_thumbnails(Image(product_card=product_card, image=name).image)
+    finally:
+        discard_staged(handles)
+    refresh_catalogue([product_card.id])
+    return results
+
+
+def delete_images(product_card, images_ids):
+    """
+    Deletes the product card's images among images_ids with one query and
+    returns their number. The per-row signals still fire: the catalogue entry
+    is refreshed once for all of them and django-cleanup removes the files
+    no other row refers to once the deletion commits.
+    """
+    with deferred_refresh(), transaction.atomic():
+        deleted, _ = Image.objects.filter(product_card=product_card, id__in=images_ids).delete()
+    return deleted
@@ -0,0 +1,31 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+
+
+SEARCH_CONFIG = 'russian'
+
+
+class SearchIndex(GinIndex):
+    """
+    GIN index over the tsvector of a text column. It is created by the
+    migrations on PostgreSQL only; on other databases its SQL is empty, so
+    the same migration applies and rolls back everywhere.
+    """
+
+    def __init__(self, field, *, name):
+        self.search_field = field
+        super().__init__(SearchVector(field, config=SEARCH_CONFIG), name=name)
+
+    def deconstruct(self):
+        path, args, kwargs = super().deconstruct()
+        return path, (self.search_field,), {'name': self.name}
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
+
+    def remove_sql(self, model, schema_editor, **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        return super().remove_sql(model, schema_editor, **kwargs)
@@ -0,0 +1,41 @@
+from time import perf_counter
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from products.models import CatalogueEntry
+from products.serializers import CatalogueEntrySerializer
+from products.fragments import render_entries
+
+
+class Command(BaseCommand):
+    help = 'Compares serializing catalogue entries with assembling them from cached fragments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, default=1000)
+        parser.add_argument('--rounds', type=int, default=20)
+
+    def get_entries(self, count):
+        return [CatalogueEntry(product_card_id=number, name=f'Product {number}', category_id=1, shop_id=1,
+                               description='Description', price=Decimal('110000.00'), quantity=14, reserved=0,
+                               parameters=[{'parameter': 'Цвет', 'value': 'золотистый'},
+                                           {'parameter': 'Диагональ (дюйм)', 'value': '6.5'}],
+                               images=[number], image_urls=[f'/media/shop_1/{number}.jpg'], version=number)
+                for number in range(1, count + 1)]
+
+    def measure(self, function, rounds):
+        started = perf_counter()
+        for _ in range(rounds):
+            function()
+        return (perf_counter() - started) / rounds
+
+    def handle(self, *args, cards, rounds, **options):
+        entries = self.get_entries(cards)
+        renderer = JSONRenderer()
+        render_entries(entries)
+        serializer_time = self.measure(
+            lambda: renderer.render(CatalogueEntrySerializer(entries, many=True).data), rounds)
+        fragments_time = self.measure(lambda: render_entries(entries), rounds)
+        scale = 1000 / cards
+        self.stdout.write(f'Serializers: {serializer_time * scale * 1000:.2f} ms per 1000 cards')
+        self.stdout.write(f'Fragments: {fragments_time * scale * 1000:.2f} ms per 1000 cards')
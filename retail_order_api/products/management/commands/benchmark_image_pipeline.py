@@ -0,0 +1,45 @@
+import os
+import shutil
+from pathlib import Path
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from products.images import process_uploads
+from retail_order_api.uploads import STAGING_DIRECTORY, get_staging_handle
+
+
+class Command(BaseCommand):
+    help = 'Measures the image pipeline throughput on a folder of sample JPEGs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('folder')
+        parser.add_argument('--workers', type=int, default=None)
+
+    def run(self, media_root, samples, workers):
+        uploads = []
+        (media_root / STAGING_DIRECTORY).mkdir()
+        for number, sample in enumerate(samples):
+            handle = get_staging_handle(sample.name)
+            shutil.copyfile(sample, media_root / handle)
+            uploads.append((handle, f'shop_0/{number}_{sample.name}'))
+        started = perf_counter()
+        results = process_uploads(uploads, workers)
+        return perf_counter() - started, results
+
+    def handle(self, *args, folder, workers, **options):
+        samples = sorted(path for path in Path(folder).iterdir() if path.suffix.lower() in ('.jpg', '.jpeg'))
+        if not samples:
+            raise CommandError(f'No JPEG files in {folder}.')
+        for label, pool_workers in (('Serial', 0), ('Pool', workers or os.cpu_count())):
+            with TemporaryDirectory() as directory, override_settings(MEDIA_ROOT=directory):
+                elapsed, results = self.run(Path(directory), samples, pool_workers)
+            failed = [result for result in results if 'error' in result]
+            totals = [result['timings']['total'] for result in results if 'timings' in result]
+            self.stdout.write(f'{label}: {len(samples)} images in {elapsed:.2f} s, '
+                              f'{len(samples) / elapsed:.1f} images/s, '
+                              f'median {median(totals) * 1000:.0f} ms per image, {len(failed)} failed')
+            for result in failed:
+                self.stdout.write(f'  {result["staged"]}: {result["error"]}')
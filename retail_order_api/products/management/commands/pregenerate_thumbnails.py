@@ -0,0 +1,23 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from products.models import Image, Thumbnail
+from products.catalogue import refresh_catalogue
+from products.thumbnails import pregenerate_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Generates the thumbnails of the images and avatars missing from the thumbnail manifest.'
+
+    def handle(self, *args, **options):
+        recorded = Thumbnail.objects.values('source')
+        images = Image.objects.exclude(image__in=recorded).order_by('id')
+        cards_ids = set()
+        for image in images.iterator():
+            pregenerate_thumbnails(image.image)
+            cards_ids.add(image.product_card_id)
+        refresh_catalogue(cards_ids)
+        users = get_user_model().objects.exclude(avatar='').exclude(avatar__in=recorded)
+        for user in users.iterator():
+            pregenerate_thumbnails(user.avatar)
+        self.stdout.write(f'Product cards refreshed: {len(cards_ids)}')
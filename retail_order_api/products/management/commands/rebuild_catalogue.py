@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products.models import ProductCard, CatalogueEntry
+from products.catalogue import refresh_catalogue
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the catalogue read model from the product cards.'
+
+    def handle(self, *args, **options):
+        CatalogueEntry.objects.exclude(product_card__status='in_stock').delete()
+        cards_ids = ProductCard.objects.filter(status='in_stock').values_list('id', flat=True)
+        refresh_catalogue(cards_ids.iterator())
+        self.stdout.write(f'Catalogue entries: {CatalogueEntry.objects.count()}')
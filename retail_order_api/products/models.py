@@ -1,10 +1,11 @@
 from django.db import models
 from django.core.validators import MinValueValidator
 from decimal import Decimal
-from easy_thumbnails.fields import ThumbnailerImageField
 from django_cleanup import cleanup
 
 from seller.models import Shop
+from retail_order_api.storage import ContentAddressedImageField
+from .indexes import SearchIndex
 
 
 STATUS_CHOICES = (
@@ -82,6 +83,7 @@ class ProductCard(models.Model):
     )
     quantity = models.PositiveIntegerField()
     status = models.CharField(choices=STATUS_CHOICES, default='in_stock')
+    search_document = models.TextField(blank=True, default='', editable=False)
 
     class Meta:
         verbose_name = 'Product card'
@@ -92,6 +94,15 @@ class ProductCard(models.Model):
                 name='unique_product_card'
             ),
         ]
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(status='in_stock'),
+                         name='card_in_stock_idx'),
+            models.Index(fields=['shop', 'id'], condition=models.Q(status='in_stock'),
+                         name='card_shop_in_stock_idx'),
+            models.Index(fields=['product', 'id'], condition=models.Q(status='in_stock'),
+                         name='card_product_in_stock_idx'),
+            SearchIndex('search_document', name='card_search_idx'),
+        ]
 
 
 class Parameter(models.Model):
@@ -115,7 +126,20 @@ class Image(models.Model):
     product_card = models.ForeignKey(ProductCard,
                                      related_name='images',
                                      on_delete=models.CASCADE)
-    image = ThumbnailerImageField(upload_to=get_upload_path)
+    image = ContentAddressedImageField(upload_to=get_upload_path)
+
+
+class Thumbnail(models.Model):
+    source = models.CharField(max_length=255)
+    alias = models.CharField(max_length=50)
+    url = models.CharField(max_length=500)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'alias'], name='unique_thumbnail_alias'),
+        ]
 
 
 class ProductParameter(models.Model):
@@ -131,4 +155,29 @@ class ProductParameter(models.Model):
         verbose_name_plural = "Product parameters"
         constraints = [
             models.UniqueConstraint(fields=['product_card', 'parameter'], name='unique_product_parameter'),
-        ]
\ No newline at end of file
+        ]
+
+
+class CatalogueEntry(models.Model):
+    product_card = models.OneToOneField(ProductCard, primary_key=True, related_name='catalogue_entry',
+                                        on_delete=models.CASCADE)
+    name = models.CharField(max_length=80)
+    category = models.ForeignKey(Category, related_name='catalogue_entries', on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, related_name='catalogue_entries', on_delete=models.CASCADE)
+    description = models.TextField(blank=True, null=True)
+    price = models.DecimalField(max_digits=15, decimal_places=2)
+    quantity = models.PositiveIntegerField()
+    reserved = models.PositiveIntegerField(default=0)
+    parameters = models.JSONField(default=list)
+    images = models.JSONField(default=list)
+    image_urls = models.JSONField(default=list)
+    thumbnails = models.JSONField(default=list)
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Catalogue entry'
+        verbose_name_plural = "Catalogue entries"
+        indexes = [
+            models.Index(fields=['shop', 'product_card'], name='catalogue_shop_idx'),
+            models.Index(fields=['category', 'product_card'], name='catalogue_category_idx'),
+        ]
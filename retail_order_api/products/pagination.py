@@ -0,0 +1,19 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ProductCursorPagination(CursorPagination):
+    """
+    Keyset pagination by card id, so every page is an index range scan
+    no matter how deep it is.
+    """
+    ordering = 'product_card_id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class ProductSearchPagination(ProductCursorPagination):
+    """
+    Pages through the search results from the most relevant one.
+    """
+    ordering = ('-rank', 'product_card_id')
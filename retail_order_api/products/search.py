@@ -0,0 +1,162 @@
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q, Count, FloatField, Func, Value
+from django.db.models.expressions import RawSQL
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.utils.module_loading import import_string
+
+from .indexes import SEARCH_CONFIG
+from .models import ProductCard, ProductParameter
+from retail_order_api.versions import bump_versions
+
+
+PARAMETER_FACETS_LIMIT = 50
+
+
+def build_search_documents(cards_ids):
+    documents = {}
+    for card_id, name, model, description in (ProductCard.objects.filter(id__in=cards_ids).
+                                              values_list('id', 'product__name', 'model', 'description')):
+        documents[card_id] = [name, model, description]
+    for card_id, value in (ProductParameter.objects.filter(product_card_id__in=documents).
+                           values_list('product_card_id', 'value')):
+        documents[card_id].append(value)
+    return {card_id: ' '.join(part for part in parts if part) for card_id, parts in documents.items()}
+
+
+class PostgresSearchBackend:
+    """
+    Matches and ranks against the tsvector of ProductCard.search_document,
+    which is backed by the card_search_idx index of the migrations.
+    """
+
+    def __init__(self, using='default'):
+        self.using = using
+
+    def prepare(self):
+        pass
+
+    def index(self, documents):
+        pass
+
+    def get_query(self, query):
+        return SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+
+    def filter(self, queryset, query):
+        return (queryset.alias(search=SearchVector('search_document', config=SEARCH_CONFIG)).
+                filter(search=self.get_query(query)))
+
+    def rank(self, queryset, query, card=''):
+        return queryset.annotate(rank=SearchRank(SearchVector(f'{card}search_document', config=SEARCH_CONFIG),
+                                                 self.get_query(query)))
+
+
+class MatchRank(Func):
+    """
+    The FTS5 rank of a card's document, negated: FTS5 ranks by bm25, where
+    the better matches are the more negative.
+    """
+    template = '(SELECT -rank FROM %(table)s WHERE %(table)s MATCH %(expressions)s)'
+    arg_joiner = ' AND rowid = '
+    output_field = FloatField()
+
+
+class SqliteSearchBackend:
+    """
+    Keeps the search documents in an FTS5 table keyed by the card id.
+    """
+    table = 'products_search'
+
+    def __init__(self, using='default'):
+        self.using = using
+
+    def prepare(self):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5(document)')
+
+    def index(self, documents):
+        with connections[self.using].cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(card_id,) for card_id in documents])
+            cursor.executemany(f'INSERT INTO {self.table} (rowid, document) VALUES (%s, %s)',
+                               list(documents.items()))
+
+    def get_terms(self, query):
+        return ' '.join('"{}"*'.format(word.replace('"', '""')) for word in query.split())
+
+    def filter(self, queryset, query):
+        return queryset.filter(id__in=RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s',
+                                             [self.get_terms(query)]))
+
+    def rank(self, queryset, query, card=''):
+        return queryset.annotate(rank=MatchRank(Value(self.get_terms(query)), f'{card}id', table=self.table))
+
+
+SEARCH_BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SqliteSearchBackend,
+}
+
+
+def get_search_backend(using='default'):
+    backend = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+    if backend:
+        return import_string(backend)(using)
+    return SEARCH_BACKENDS[connections[using].vendor](using)
+
+
+def update_search_documents(cards_ids):
+    documents = build_search_documents(cards_ids)
+    ProductCard.objects.bulk_update(
+        [ProductCard(id=card_id, search_document=document) for card_id, document in documents.items()],
+        ['search_document'],
+        batch_size=1000
+    )
+    get_search_backend().index(documents)
+    bump_versions(['search'])
+
+
+def get_price_filter(low, high):
+    price_filter = Q()
+    if low is not None:
+        price_filter &= Q(price__gte=low)
+    if high is not None:
+        price_filter &= Q(price__lt=high)
+    return price_filter
+
+
+def get_price_buckets():
+    bounds = [None, *settings.PRODUCT_SEARCH_PRICE_BUCKETS, None]
+    return list(zip(bounds, bounds[1:]))
+
+
+def count_groups(groups, key, name):
+    counts = {}
+    for group in groups:
+        facet = counts.setdefault(group[key], {'id': group[key], 'name': group[name], 'count': 0})
+        facet['count'] += group['count']
+    return sorted(counts.values(), key=lambda facet: (-facet['count'], facet['id']))
+
+
+def get_facets(cards):
+    """
+    Counts the matched cards by category, shop, parameter value and price
+    bucket with two queries: the first one groups the matches by category
+    and shop, counting each price bucket too, and is summed up here; the
+    second one groups their parameter values.
+    """
+    cards = cards.order_by()
+    buckets = get_price_buckets()
+    groups = list(cards.values('product__category_id', 'product__category__name', 'shop_id', 'shop__name').
+                  annotate(count=Count('id'), **{f'bucket_{number}': Count('id', filter=get_price_filter(low, high))
+                                                 for number, (low, high) in enumerate(buckets)}))
+    parameters = (ProductParameter.objects.filter(product_card__in=cards.values('id')).
+                  values('parameter__name', 'value').annotate(count=Count('id')).
+                  order_by('-count', 'parameter__name', 'value')[:PARAMETER_FACETS_LIMIT])
+    return {
+        'categories': count_groups(groups, 'product__category_id', 'product__category__name'),
+        'shops': count_groups(groups, 'shop_id', 'shop__name'),
+        'parameters': [{'name': parameter['parameter__name'], 'value': parameter['value'],
+                        'count': parameter['count']} for parameter in parameters],
+        'prices': [{'from': low, 'to': high, 'count': sum(group[f'bucket_{number}'] for group in groups)}
+                   for number, (low, high) in enumerate(buckets)],
+    }
@@ -1,19 +1,52 @@
 from rest_framework import serializers
 
-from products.models import ProductCard, ProductParameter
+from products.models import CatalogueEntry
 
 
-class ParameterSerializer(serializers.ModelSerializer):
-    parameter = serializers.StringRelatedField()
+class CatalogueEntrySerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='product_card_id')
 
     class Meta:
-        model = ProductParameter
-        fields = ('parameter', 'value')
+        model = CatalogueEntry
+        fields = ('id', 'name', 'description', 'shop', 'parameters', 'price', 'quantity', 'reserved',
+                  'images', 'image_urls', 'thumbnails')
 
-class ProductSerializer(serializers.ModelSerializer):
-    name = serializers.StringRelatedField(source='product')
-    parameters = ParameterSerializer(many=True)
 
-    class Meta:
-        model = ProductCard
-        fields = ('id', 'name', 'description', 'shop', 'parameters', 'price', 'quantity', 'images')
+class ProductFilterSerializer(serializers.Serializer):
+    category = serializers.IntegerField(required=False, min_value=1)
+    shop = serializers.IntegerField(required=False, min_value=1)
+
+
+class ProductSearchSerializer(ProductFilterSerializer):
+    q = serializers.CharField(max_length=200)
+    price_min = serializers.DecimalField(max_digits=15, decimal_places=2, required=False)
+    price_max = serializers.DecimalField(max_digits=15, decimal_places=2, required=False)
+
+
+class FacetSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    count = serializers.IntegerField()
+
+
+class ParameterFacetSerializer(serializers.Serializer):
+    name = serializers.CharField()
+    value = serializers.CharField()
+    count = serializers.IntegerField()
+
+
+class PriceFacetSerializer(serializers.Serializer):
+    to = serializers.DecimalField(max_digits=15, decimal_places=2, allow_null=True)
+    count = serializers.IntegerField()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['from'] = serializers.DecimalField(max_digits=15, decimal_places=2, allow_null=True)
+        return fields
+
+
+class FacetsSerializer(serializers.Serializer):
+    categories = FacetSerializer(many=True)
+    shops = FacetSerializer(many=True)
+    parameters = ParameterFacetSerializer(many=True)
+    prices = PriceFacetSerializer(many=True)
@@ -1,9 +1,14 @@
 from django.dispatch import receiver
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
 from django.conf import settings
 from django.dispatch import Signal
 
-from .models import ProductCard
+from .models import Category, Parameter, Product, ProductCard, ProductParameter, Image, Thumbnail
+from .search import get_search_backend
+from .catalogue import request_refresh, refresh_shop_catalogue
+from seller.models import Shop
+from retail_order_api.storage import content_deleted
+from retail_order_api.versions import bump_versions
 
 
 @receiver(pre_save, sender=ProductCard, dispatch_uid="pre_save_product")
@@ -16,3 +21,48 @@ def pre_save_product(sender, instance, update_fields, **kwargs):
     return instance
 
 
+def prepare_search_backend(sender, using, **kwargs):
+    get_search_backend(using).prepare()
+
+
+@receiver(post_save, sender=ProductCard, dispatch_uid="post_save_product_catalogue")
+def refresh_product_catalogue(sender, instance, **kwargs):
+    request_refresh([instance.id], search=True)
+
+
+@receiver(post_save, sender=Product, dispatch_uid="post_save_product_name_catalogue")
+def refresh_product_name_catalogue(sender, instance, created, **kwargs):
+    if not created:
+        request_refresh(list(instance.product_cards.values_list('id', flat=True)), search=True)
+
+
+@receiver(post_save, sender=ProductParameter, dispatch_uid="post_save_parameter_catalogue")
+@receiver(post_save, sender=Image, dispatch_uid="post_save_image_catalogue")
+def refresh_product_details_catalogue(sender, instance, **kwargs):
+    request_refresh([instance.product_card_id], search=sender is ProductParameter)
+
+
+@receiver(post_delete, sender=ProductParameter, dispatch_uid="post_delete_parameter_catalogue")
+@receiver(post_delete, sender=Image, dispatch_uid="post_delete_image_catalogue")
+def refresh_deleted_product_details_catalogue(sender, instance, origin, **kwargs):
+    # Cascades from a deleted card remove its catalogue entry on their own.
+    if getattr(origin, 'model', type(origin)) is sender:
+        request_refresh([instance.product_card_id], search=sender is ProductParameter)
+
+
+@receiver(post_save, sender=Shop, dispatch_uid="post_save_shop_catalogue")
+def refresh_shop_product_catalogue(sender, instance, created, update_fields, **kwargs):
+    if not created and (update_fields is None or 'open_for_orders' in update_fields):
+        refresh_shop_catalogue(instance.id)
+
+
+@receiver(post_save, sender=Category, dispatch_uid="post_save_category_search")
+@receiver(post_save, sender=Parameter, dispatch_uid="post_save_parameter_name_search")
+def bump_search_version(sender, instance, **kwargs):
+    # The search facets show the category and parameter names.
+    bump_versions(['search'])
+
+
+@receiver(content_deleted, dispatch_uid="content_deleted_thumbnails")
+def delete_thumbnails_manifest(sender, names, **kwargs):
+    Thumbnail.objects.filter(source__in=names).delete()
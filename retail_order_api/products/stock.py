@@ -0,0 +1,51 @@
+from django.db.models import Case, When, F, Value, PositiveIntegerField
+
+from .models import ProductCard
+from .exceptions import InsufficientStockError
+
+
+def lock_product_cards(cards_ids):
+    return {card.id: card for card in (ProductCard.objects.select_for_update().
+                                       filter(id__in=cards_ids).order_by('id'))}
+
+
+def take_stock(quantities):
+    """
+    Locks the product cards in id order, checks that every requested
+    quantity is in stock and decrements all of them with a single UPDATE.
+    Must be called inside a transaction. Returns the locked cards by id.
+    """
+    cards = lock_product_cards(quantities)
+    shortages = []
+    for card_id, quantity in sorted(quantities.items()):
+        card = cards.get(card_id)
+        available = card.quantity if card and card.status == 'in_stock' else 0
+        if quantity > available:
+            shortages.append({'product_card': card_id, 'requested': quantity, 'available': available})
+    if shortages:
+        raise InsufficientStockError(shortages)
+    ProductCard.objects.filter(id__in=quantities).update(
+        quantity=Case(*[When(id=card_id, quantity__gte=quantity, then=F('quantity') - quantity)
+                        for card_id, quantity in quantities.items()],
+                      default=F('quantity'), output_field=PositiveIntegerField()),
+        status=Case(*[When(id=card_id, quantity=quantity, then=Value('sold'))
+                      for card_id, quantity in quantities.items()],
+                    default=F('status'))
+    )
+    return cards
+
+
+def return_stock(quantities):
+    """
+    Puts the quantities back with a single UPDATE; sold cards get back in stock.
+    Must be called inside a transaction.
+    """
+    if not quantities:
+        return
+    lock_product_cards(quantities)
+    ProductCard.objects.filter(id__in=quantities).update(
+        quantity=Case(*[When(id=card_id, then=F('quantity') + quantity)
+                        for card_id, quantity in quantities.items()],
+                      default=F('quantity'), output_field=PositiveIntegerField()),
+        status=Case(When(status='sold', then=Value('in_stock')), default=F('status'))
+    )
@@ -1,3 +1,298 @@
-from django.test import TestCase
+from rest_framework.test import APITestCase
+from django.test import TestCase, override_settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from rest_framework import status
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from decimal import Decimal
+from unittest import mock
+from tempfile import TemporaryDirectory
+from PIL import Image as PILImage
+import io
+import json
 
-# Create your tests here.
+from .models import Category, Product, ProductCard, Parameter, ProductParameter, CatalogueEntry, Image, Thumbnail
+from .images import ingest_images, process_uploads
+from .search import get_search_backend, get_facets, update_search_documents
+from .fragments import get_fragment_key
+from .catalogue import deferred_refresh
+from seller.models import Shop
+from seller.importer import PriceListImporter
+from retail_order_api.storage import sweep_content
+
+User = get_user_model()
+
+
+class ProductListTest(APITestCase):
+
+    def setUp(self):
+        self.url = reverse('products:products')
+        seller = User.objects.create_user(first_name='Ivan', last_name='Ivanov', email='ivan.ivanov@gmail.com',
+                                          is_active=True, type='seller', password='12345678')
+        self.shop = Shop.objects.create(name='Связной', user=seller)
+        self.categories = [Category.objects.create(id=224, name='Смартфоны'),
+                           Category.objects.create(id=15, name='Аксессуары')]
+        parameter = Parameter.objects.create(name='Цвет')
+        for number in range(12):
+            product = Product.objects.create(name=f'Product {number}', category=self.categories[number % 2])
+            product_card = ProductCard.objects.create(product_code=number, model='model', product=product,
+                                                      shop=self.shop, price=Decimal('100'),
+                                                      price_rrc=Decimal('110'), quantity=5)
+            ProductParameter.objects.create(product_card=product_card, parameter=parameter, value='белый')
+        product_card = ProductCard.objects.get(product_code=0)
+        product_card.quantity = 0
+        product_card.save()
+
+    def test_get_products_by_pages(self):
+        ids = []
+        url = f'{self.url}?page_size=5'
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            ids.extend(product['id'] for product in response.json()['results'])
+            url = response.json()['next']
+        self.assertEqual(list(ProductCard.objects.filter(status='in_stock').order_by('id').
+                              values_list('id', flat=True)), ids)
+
+    def test_get_products_by_category(self):
+        response = self.client.get(self.url, data={'category': 224})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        products = response.json()['results']
+        self.assertEqual(5, len(products))
+        self.assertEqual([{'parameter': 'Цвет', 'value': 'белый'}], products[0]['parameters'])
+
+    def test_catalogue_follows_product_changes(self):
+        product_card = ProductCard.objects.filter(status='in_stock').first()
+        product_card.price = Decimal('90')
+        product_card.save()
+        ProductParameter.objects.filter(product_card=product_card).delete()
+        entry = CatalogueEntry.objects.get(product_card=product_card)
+        self.assertEqual(Decimal('90'), entry.price)
+        self.assertEqual([], entry.parameters)
+        self.shop.open_for_orders = False
+        self.shop.save(update_fields=['open_for_orders'])
+        self.assertFalse(CatalogueEntry.objects.exists())
+
+    def test_deferred_refresh_runs_once(self):
+        product_cards = ProductCard.objects.filter(status='in_stock')[:3]
+        with mock.patch('products.catalogue.refresh_catalogue') as refresh_catalogue, deferred_refresh():
+            for product_card in product_cards:
+                product_card.price = Decimal('90')
+                product_card.save()
+                ProductParameter.objects.filter(product_card=product_card).delete()
+        cards_ids = {product_card.id for product_card in product_cards}
+        refresh_catalogue.assert_called_once_with(cards_ids)
+        self.assertFalse(ProductCard.objects.filter(id__in=cards_ids, search_document__contains='белый').exists())
+
+    def test_get_products_from_fragment_cache(self):
+        response = self.client.get(self.url)
+        entry = CatalogueEntry.objects.order_by('product_card_id').first()
+        self.assertEqual(response.json()['results'][0], json.loads(cache.get(get_fragment_key(entry))))
+        ProductCard.objects.get(id=entry.product_card_id).save()
+        entry.refresh_from_db()
+        self.assertIsNone(cache.get(get_fragment_key(entry)))
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()['results'][0], json.loads(cache.get(get_fragment_key(entry))))
+
+    def test_get_products_not_modified(self):
+        response = self.client.get(self.url)
+        etag = response.headers['ETag']
+        self.assertIn('public', response.headers['Cache-Control'])
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        product_card = ProductCard.objects.filter(status='in_stock').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            product_card.save()
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_get_products_with_wrong_filter(self):
+        response = self.client.get(self.url, data={'shop': 'shop'})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+
+class ProductSearchTest(APITestCase):
+
+    def setUp(self):
+        self.url = reverse('products:products_search')
+        seller = User.objects.create_user(first_name='Ivan', last_name='Ivanov', email='ivan.ivanov@gmail.com',
+                                          is_active=True, type='seller', password='12345678')
+        shop = Shop.objects.create(name='Связной', user=seller)
+        categories = [{'id': 224, 'name': 'Смартфоны'}, {'id': 15, 'name': 'Аксессуары'}]
+        goods = [
+            {'id': 4216292, 'category': 224, 'model': 'apple/iphone/xs-max',
+             'name': 'Смартфон Apple iPhone XS Max 512GB (золотистый)',
+             'price': Decimal('110000'), 'price_rrc': Decimal('116990'), 'quantity': 14,
+             'parameters': {'Цвет': 'золотистый'}},
+            {'id': 4244124, 'category': 224, 'model': 'apple/iphone/xr',
+             'name': 'Смартфон Apple iPhone XR 256GB (красный)',
+             'price': Decimal('65000'), 'price_rrc': Decimal('69990'), 'quantity': 9,
+             'parameters': {'Цвет': 'красный'}},
+            {'id': 4117350, 'category': 15, 'model': 'apple/airpods', 'name': 'Наушники Apple AirPods',
+             'price': Decimal('11000'), 'price_rrc': Decimal('12990'), 'quantity': 5,
+             'parameters': {'Цвет': 'белый'}},
+        ]
+        PriceListImporter(shop).run(categories, goods)
+
+    def test_search_products(self):
+        response = self.client.get(self.url, data={'q': 'iphone'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        data = response.json()
+        self.assertEqual({4216292, 4244124},
+                         set(ProductCard.objects.filter(id__in=[product['id'] for product in data['results']]).
+                             values_list('product_code', flat=True)))
+        self.assertEqual([{'id': 224, 'name': 'Смартфоны', 'count': 2}], data['facets']['categories'])
+        self.assertEqual(2, sum(parameter['count'] for parameter in data['facets']['parameters']))
+        self.assertEqual({'from': '100000.00', 'to': None, 'count': 1}, data['facets']['prices'][-1])
+
+    def test_facets_take_two_queries(self):
+        cards = get_search_backend().filter(ProductCard.objects.all(), 'apple')
+        with self.assertNumQueries(2):
+            facets = get_facets(cards)
+        self.assertEqual([{'id': 224, 'name': 'Смартфоны', 'count': 2}, {'id': 15, 'name': 'Аксессуары', 'count': 1}],
+                         facets['categories'])
+        self.assertEqual([{'id': Shop.objects.get().id, 'name': 'Связной', 'count': 3}], facets['shops'])
+        self.assertEqual([0, 0, 0, 1, 1, 1], [bucket['count'] for bucket in facets['prices']])
+
+    def test_search_products_by_relevance(self):
+        ProductCard.objects.filter(product_code=4244124).update(description='iPhone XR, iPhone для всех')
+        update_search_documents(ProductCard.objects.values_list('id', flat=True))
+        response = self.client.get(self.url, data={'q': 'iphone', 'page_size': 1})
+        self.assertEqual(4244124, ProductCard.objects.get(id=response.json()['results'][0]['id']).product_code)
+        response = self.client.get(response.json()['next'])
+        self.assertEqual(4216292, ProductCard.objects.get(id=response.json()['results'][0]['id']).product_code)
+        self.assertIsNone(response.json()['next'])
+
+    def test_search_products_by_parameter_value(self):
+        response = self.client.get(self.url, data={'q': 'белый', 'price_max': 20000})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(1, len(response.json()['results']))
+
+    def test_search_follows_card_changes(self):
+        card = ProductCard.objects.get(product_code=4117350)
+        card.model = 'apple/airpods-pro'
+        card.save()
+        ProductParameter.objects.filter(product_card=card).update(value='черный')
+        ProductParameter.objects.get(product_card=card).save()
+        product = card.product
+        product.name = 'Наушники Apple AirPods Pro'
+        product.save()
+        for query, count in (('pro', 1), ('черный', 1), ('белый', 0)):
+            response = self.client.get(self.url, data={'q': query})
+            self.assertEqual(count, len(response.json()['results']), query)
+
+    def test_search_products_not_modified(self):
+        response = self.client.get(self.url, data={'q': 'iphone'})
+        etag = response.headers['ETag']
+        self.assertIn('private', response.headers['Cache-Control'])
+        self.assertNotIn('public', response.headers['Cache-Control'])
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, data={'q': 'iphone'}, headers={'If-None-Match': etag})
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        category = Category.objects.get(id=224)
+        category.name = 'Телефоны'
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+        response = self.client.get(self.url, data={'q': 'iphone'}, headers={'If-None-Match': etag})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('Телефоны', response.json()['facets']['categories'][0]['name'])
+
+    def test_search_products_without_query(self):
+        response = self.client.get(self.url)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+
+class ImagePipelineTest(TestCase):
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        seller = User.objects.create_user(first_name='Ivan', last_name='Ivanov', email='ivan.ivanov@gmail.com',
+                                          is_active=True, type='seller', password='12345678')
+        shop = Shop.objects.create(name='Связной', user=seller)
+        product = Product.objects.create(name='Product', category=Category.objects.create(id=224, name='Смартфоны'))
+        self.product_card = ProductCard.objects.create(product_code=1, model='model', product=product, shop=shop,
+                                                       price=Decimal('100'), price_rrc=Decimal('110'), quantity=1)
+
+    def stage(self, name, color='red'):
+        stream = io.BytesIO()
+        PILImage.new('RGB', (1200, 800), color).save(stream, 'JPEG')
+        return default_storage.save(name, ContentFile(stream.getvalue()))
+
+    def assert_ingested(self, workers):
+        names = [self.stage(f'photo_{number}.jpg', color) for number, color in enumerate(['red', 'green', 'blue'])]
+        names.append(default_storage.save('broken.jpg', ContentFile(b'not an image')))
+        results = ingest_images(self.product_card, names, workers=workers)
+        self.assertEqual([None, None, None, 'broken.jpg'],
+                         [result['staged'] if 'error' in result else None for result in results])
+        self.assertEqual({'small', 'medium', 'large'}, set(results[0]['timings']['thumbnails']))
+        self.assertFalse(any(default_storage.exists(name) for name in names))
+        images = list(Image.objects.filter(product_card=self.product_card).order_by('id'))
+        self.assertEqual([result['name'] for result in results[:3]], [image.image.name for image in images])
+        self.assertTrue(all(image.image.name.startswith('content/') for image in images))
+        with mock.patch('easy_thumbnails.files.Thumbnailer.generate_thumbnail') as generate_thumbnail:
+            self.assertEqual((100, 67), images[0].image['small'].image.size)
+        generate_thumbnail.assert_not_called()
+        entry = CatalogueEntry.objects.get(product_card=self.product_card)
+        self.assertEqual(3, len(entry.images))
+        self.assertEqual(9, Thumbnail.objects.count())
+        self.assertEqual({'url': images[0].image['small'].url, 'width': 100, 'height': 67},
+                         entry.thumbnails[0]['small'])
+        self.assertEqual([(640, 427), (1000, 667)],
+                         [(entry.thumbnails[2][alias]['width'], entry.thumbnails[2][alias]['height'])
+                          for alias in ('medium', 'large')])
+
+    def test_ingest_images_in_place(self):
+        self.assert_ingested(workers=0)
+
+    def test_ingest_images_in_pool(self):
+        self.assert_ingested(workers=2)
+
+    def test_identical_uploads_share_files(self):
+        image, = ingest_images(self.product_card, [self.stage('photo.jpg')], workers=0)
+        other_card = ProductCard.objects.create(product_code=2, model='model', product=self.product_card.product,
+                                                shop=self.product_card.shop, price=Decimal('100'),
+                                                price_rrc=Decimal('110'), quantity=1)
+        other_image, = ingest_images(other_card, [self.stage('copy.jpg')], workers=0)
+        self.assertEqual(image['name'], other_image['name'])
+        self.assertEqual({}, other_image['timings']['thumbnails'])
+        thumbnail_name = Image.objects.get(product_card=other_card).image['small'].name
+        self.assertEqual(3, Thumbnail.objects.filter(source=image['name']).count())
+        self.assertEqual(Thumbnail.objects.get(source=image['name'], alias='small').url,
+                         CatalogueEntry.objects.get(product_card=other_card).thumbnails[0]['small']['url'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Image.objects.get(product_card=self.product_card).delete()
+        self.assertTrue(default_storage.exists(image['name']))
+        self.assertTrue(default_storage.exists(thumbnail_name))
+        with self.captureOnCommitCallbacks(execute=True):
+            Image.objects.get(product_card=other_card).delete()
+        self.assertFalse(default_storage.exists(image['name']))
+        self.assertFalse(default_storage.exists(thumbnail_name))
+        self.assertFalse(Thumbnail.objects.exists())
+
+    def test_restore_content_swept_during_ingestion(self):
+        image, = ingest_images(self.product_card, [self.stage('photo.jpg')], workers=0)
+        Image.objects.filter(product_card=self.product_card).delete()
+
+        def process_and_sweep(uploads, workers=None):
+            results = process_uploads(uploads, workers)
+            sweep_content(Image._meta.get_field('image'), [result['name'] for result in results])
+            return results
+
+        staged = self.stage('copy.jpg')
+        with mock.patch('products.images.process_uploads', process_and_sweep):
+            ingest_images(self.product_card, [staged], workers=0)
+        restored = Image.objects.get(product_card=self.product_card).image
+        self.assertEqual(image['name'], restored.name)
+        self.assertTrue(default_storage.exists(restored.name))
+        self.assertTrue(default_storage.exists(restored['small'].name))
+        self.assertEqual(3, Thumbnail.objects.filter(source=restored.name).count())
+        self.assertFalse(default_storage.exists(staged))
@@ -0,0 +1,41 @@
+from easy_thumbnails.storage import thumbnail_default_storage
+
+from retail_order_api.storage import get_field_thumbnailer, get_thumbnail_options
+from .models import Thumbnail
+
+
+def record_thumbnails(thumbnails):
+    """
+    Upserts the manifest rows of {source name: {alias: {name, width, height}}}
+    with the thumbnail URLs, so readers never touch the storage or PIL.
+    """
+    Thumbnail.objects.bulk_create(
+        [Thumbnail(source=source, alias=alias, url=thumbnail_default_storage.url(thumbnail['name']),
+                   width=thumbnail['width'], height=thumbnail['height'])
+         for source, aliases in thumbnails.items() for alias, thumbnail in aliases.items()],
+        update_conflicts=True,
+        unique_fields=['source', 'alias'],
+        update_fields=['url', 'width', 'height']
+    )
+
+
+def pregenerate_thumbnails(field_file):
+    """
+    Generates the missing alias thumbnails of a saved field file and records
+    all of them in the manifest.
+    """
+    thumbnailer = get_field_thumbnailer(field_file.field, field_file.name)
+    thumbnails = {}
+    for alias, options in get_thumbnail_options(thumbnailer).items():
+        thumbnail = thumbnailer.get_thumbnail(options)
+        thumbnails[alias] = {'name': thumbnail.name, 'width': thumbnail.width, 'height': thumbnail.height}
+    record_thumbnails({field_file.name: thumbnails})
+    return thumbnails
+
+
+def get_manifest(sources):
+    manifest = {}
+    for source, alias, url, width, height in (Thumbnail.objects.filter(source__in=set(sources)).
+                                              values_list('source', 'alias', 'url', 'width', 'height')):
+        manifest.setdefault(source, {})[alias] = {'url': url, 'width': width, 'height': height}
+    return manifest
@@ -1,10 +1,11 @@
 from django.urls import re_path, path
 from rest_framework.authtoken import views
 
-from products.views import ProductList
+from products.views import ProductList, ProductSearch
 
 
 app_name = 'products'
 urlpatterns = [
-    path('products/', ProductList.as_view(), name='products')
+    path('products/', ProductList.as_view(), name='products'),
+    path('products/search/', ProductSearch.as_view(), name='products_search'),
 ]
\ No newline at end of file
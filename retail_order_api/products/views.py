@@ -1,14 +1,91 @@
 from rest_framework import generics
+from django.http import HttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
-from .models import ProductCard
-from .serializers import ProductSerializer
+from .models import ProductCard, CatalogueEntry
+from .serializers import (CatalogueEntrySerializer, ProductFilterSerializer, ProductSearchSerializer,
+                          FacetsSerializer)
+from .pagination import ProductCursorPagination, ProductSearchPagination
+from .search import get_search_backend, get_facets
+from .fragments import render_page
+from retail_order_api.versions import get_etag
 
 
+def get_catalogue_etag(request, *args, **kwargs):
+    shop = request.GET.get('shop', '')
+    return get_etag(request, f'catalogue:shop:{shop}' if shop.isdigit() else 'catalogue')
+
+
+def get_search_etag(request, *args, **kwargs):
+    # Matches, ranks and facets can change with any card, whatever the shop.
+    return get_etag(request, 'catalogue', 'search')
+
+
+@method_decorator(cache_control(public=True, max_age=60, stale_while_revalidate=30), name='get')
+@method_decorator(condition(etag_func=get_catalogue_etag), name='get')
 class ProductList(generics.ListAPIView):
-    queryset = ProductCard.objects.all().filter(status='in_stock', shop__open_for_orders=True)
-    serializer_class = ProductSerializer
-    filterset_fields = ['category', 'shop']
+    serializer_class = CatalogueEntrySerializer
+    filter_serializer_class = ProductFilterSerializer
+    pagination_class = ProductCursorPagination
+
+    def get_filters(self):
+        serializer = self.filter_serializer_class(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def get_queryset(self):
+        filters = self.get_filters()
+        entries = CatalogueEntry.objects.all()
+        if 'category' in filters:
+            entries = entries.filter(category_id=filters['category'])
+        if 'shop' in filters:
+            entries = entries.filter(shop_id=filters['shop'])
+        return entries
+
+    def get_extra_data(self):
+        return {}
+
+    def list(self, request, *args, **kwargs):
+        entries = self.paginate_queryset(self.get_queryset())
+        content = render_page(entries, next=self.paginator.get_next_link(),
+                              previous=self.paginator.get_previous_link(), **self.get_extra_data())
+        return HttpResponse(content, content_type='application/json')
+
+
+@method_decorator(cache_control(private=True, no_cache=True), name='get')
+@method_decorator(condition(etag_func=get_search_etag), name='get')
+class ProductSearch(ProductList):
+    filter_serializer_class = ProductSearchSerializer
+    pagination_class = ProductSearchPagination
 
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
 
+    def get_cards(self, filters):
+        cards = ProductCard.objects.filter(status='in_stock', shop__open_for_orders=True)
+        if 'category' in filters:
+            cards = cards.filter(product__category_id=filters['category'])
+        if 'shop' in filters:
+            cards = cards.filter(shop_id=filters['shop'])
+        if 'price_min' in filters:
+            cards = cards.filter(price__gte=filters['price_min'])
+        if 'price_max' in filters:
+            cards = cards.filter(price__lte=filters['price_max'])
+        return get_search_backend().filter(cards, filters['q'])
 
+    def get_queryset(self):
+        """
+        Keeps the matched cards for the facets and returns their catalogue
+        entries annotated with the search rank.
+        """
+        filters = self.get_filters()
+        self.cards = self.get_cards(filters)
+        entries = CatalogueEntry.objects.filter(product_card__in=self.cards.values('id'))
+        return get_search_backend().rank(entries, filters['q'], card='product_card__')
 
+    def get_extra_data(self):
+        if self.request.query_params.get(self.paginator.cursor_query_param):
+            return {}
+        return {'facets': FacetsSerializer(get_facets(self.cards)).data}
@@ -0,0 +1,183 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from queue import Queue
+from threading import Lock, Thread
+from time import monotonic, perf_counter
+from celery import current_app, shared_task
+from django.conf import settings
+from django.db import transaction
+
+
+logger = logging.getLogger(__name__)
+_batch = ContextVar('dispatch_batch', default=None)
+
+
+class DispatchMetrics:
+    """
+    In-process counters of the task publications and their latency.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        self.publishes = 0
+        self.calls = 0
+        self.fallbacks = 0
+        self.failures = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def record(self, calls, latency, fallback=False, failed=False):
+        with self.lock:
+            self.publishes += 1
+            self.calls += calls
+            self.fallbacks += fallback
+            self.failures += failed
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+
+    def snapshot(self):
+        with self.lock:
+            return {'publishes': self.publishes, 'calls': self.calls, 'fallbacks': self.fallbacks,
+                    'failures': self.failures, 'latency_max': self.latency_max,
+                    'latency_avg': self.latency_total / self.publishes if self.publishes else 0.0}
+
+
+metrics = DispatchMetrics()
+
+
+def run_calls(calls):
+    """
+    Runs the calls one by one; a failing call is logged and does not keep
+    the following ones from running. Returns the number of failed calls.
+    """
+    failed = 0
+    for name, args, kwargs in calls:
+        try:
+            current_app.tasks[name](*args, **kwargs)
+        except Exception:
+            failed += 1
+            logger.exception('Dispatched task %s failed.', name)
+    return failed
+
+
+@shared_task()
+def run_dispatched_tasks(calls):
+    failed = run_calls(calls)
+    return {'calls': len(calls), 'failed': failed}
+
+
+class FallbackQueue:
+    """
+    Runs the batches that could not be published in a background thread of
+    the current process.
+    """
+
+    def __init__(self):
+        self.queue = Queue()
+        self.lock = Lock()
+        self.thread = None
+        self.open_until = 0
+
+    @property
+    def is_open(self):
+        return monotonic() < self.open_until
+
+    def open(self):
+        self.open_until = monotonic() + settings.DISPATCH_FALLBACK_COOLDOWN
+
+    def put(self, calls):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = Thread(target=self.run, name='dispatch-fallback', daemon=True)
+                self.thread.start()
+        self.queue.put(calls)
+
+    def run(self):
+        while True:
+            calls = self.queue.get()
+            try:
+                run_calls(calls)
+            finally:
+                self.queue.task_done()
+
+
+fallback = FallbackQueue()
+
+
+def publish(calls):
+    """
+    Sends the calls to the broker as one message: a single call is published
+    as its own task, several ones as a run_dispatched_tasks batch. When the
+    publication fails or the broker was slow to accept the previous one, the
+    calls go to the in-process fallback queue for DISPATCH_FALLBACK_COOLDOWN.
+    """
+    started = perf_counter()
+    if fallback.is_open:
+        fallback.put(calls)
+        metrics.record(len(calls), perf_counter() - started, fallback=True)
+        return
+    try:
+        if len(calls) == 1:
+            name, args, kwargs = calls[0]
+            current_app.tasks[name].apply_async(args, kwargs, retry=False)
+        else:
+            run_dispatched_tasks.apply_async((calls,), retry=False)
+    except Exception:
+        logger.exception('Task publication failed, running %s calls in the fallback queue.', len(calls))
+        fallback.open()
+        fallback.put(calls)
+        metrics.record(len(calls), perf_counter() - started, fallback=True, failed=True)
+        return
+    latency = perf_counter() - started
+    if latency > settings.DISPATCH_SLOW_PUBLISH:
+        logger.warning('Task publication took %.3f s, switching to the fallback queue.', latency)
+        fallback.open()
+    metrics.record(len(calls), latency)
+
+
+def collect(call):
+    batch = _batch.get()
+    if batch is None:
+        publish([call])
+    elif call not in batch:
+        batch.append(call)
+
+
+def dispatch(task, *args, **kwargs):
+    """
+    Publishes the task call once the current transaction commits; nothing
+    is sent if it rolls back. Inside batching() the committed calls are
+    collected, deduplicated and published together when the block exits.
+    """
+    call = (task.name, args, kwargs)
+    transaction.on_commit(lambda: collect(call))
+
+
+@contextmanager
+def batching():
+    batch = []
+    token = _batch.set(batch)
+    try:
+        yield batch
+    finally:
+        _batch.reset(token)
+        if batch:
+            publish(batch)
+
+
+class DispatchMiddleware:
+    """
+    Coalesces the tasks dispatched while handling a request into a single
+    broker publication sent after the response is produced.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with batching():
+            return self.get_response(request)
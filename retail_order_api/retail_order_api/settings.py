@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+import sys
 
 
 load_dotenv()
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
     'products.apps.ProductsConfig',
     'seller.apps.SellerConfig',
     'buyer.apps.BuyerConfig',
+    'mailer.apps.MailerConfig',
 
     'drf_spectacular',
     'allauth',
@@ -70,6 +72,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
     "allauth.account.middleware.AccountMiddleware",
+    'retail_order_api.dispatch.DispatchMiddleware',
 ]
 
 ROOT_URLCONF = 'retail_order_api.urls'
@@ -187,9 +190,51 @@ DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 SERVER_EMAIL = EMAIL_HOST_USER
 EMAIL_ADMIN = EMAIL_HOST_USER
 
+MAILER_BATCH_SIZE = int(os.getenv('MAILER_BATCH_SIZE', 100))
+MAILER_RATE_LIMIT = float(os.getenv('MAILER_RATE_LIMIT', 10))
+MAILER_MAX_ATTEMPTS = int(os.getenv('MAILER_MAX_ATTEMPTS', 5))
+MAILER_RETRY_DELAY = int(os.getenv('MAILER_RETRY_DELAY', 60))
+MAILER_CLAIM_TIMEOUT = int(os.getenv('MAILER_CLAIM_TIMEOUT', 900))
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', 'redis://localhost:6379/3'),
+    }
+}
+CATALOGUE_FRAGMENT_TIMEOUT = 60 * 60 * 24
+
 
 CELERY_BROKER_URL = "redis://localhost:6379/1"
 CELERY_RESULT_BACKEND = "redis://localhost:6379/2"
+CELERY_TASK_ALWAYS_EAGER = 'test' in sys.argv
+CELERY_BEAT_SCHEDULE = {
+    'release-expired-stock-reservations': {
+        'task': 'buyer.tasks.release_expired_reservations_task',
+        'schedule': 60.0,
+    },
+    'drain-outbound-email': {
+        'task': 'mailer.tasks.drain_outbox_task',
+        'schedule': 60.0,
+    },
+    'sweep-upload-staging': {
+        'task': 'retail_order_api.uploads.sweep_staging_task',
+        'schedule': 3600.0,
+    },
+}
+
+
+DISPATCH_SLOW_PUBLISH = float(os.getenv('DISPATCH_SLOW_PUBLISH', 0.5))
+DISPATCH_FALLBACK_COOLDOWN = int(os.getenv('DISPATCH_FALLBACK_COOLDOWN', 30))
+
+
+STOCK_RESERVATION_ENABLED = os.getenv('STOCK_RESERVATION_ENABLED', 'False') == 'True'
+STOCK_RESERVATION_TTL = int(os.getenv('STOCK_RESERVATION_TTL', 900))
+
+
+PRODUCT_SEARCH_BACKEND = os.getenv('PRODUCT_SEARCH_BACKEND')
+PRODUCT_SEARCH_PRICE_BUCKETS = [1000, 5000, 10000, 50000, 100000]
 
 
 SPECTACULAR_SETTINGS = {
@@ -229,6 +274,8 @@ LOGOUT_REDIRECT_URL = 'products:products'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 
+INVOICE_CACHE_DIR = os.getenv('INVOICE_CACHE_DIR', os.path.join(BASE_DIR, 'invoices/'))
+
 
 THUMBNAIL_ALIASES = {
     'products': {
@@ -237,3 +284,11 @@ THUMBNAIL_ALIASES = {
         'large': {'size': (1000, 1000)}
     }
 }
+# Pool processes each image ingestion task starts. Every Celery worker process
+# runs its own pool, so a worker started with --concurrency=C runs up to
+# C * IMAGE_PIPELINE_WORKERS of them: keep the product at most the number of
+# cores. The default 0 decodes the images in the worker process itself, which
+# already keeps C cores busy; raise it for a worker with a low --concurrency
+# (e.g. a dedicated images queue with --concurrency=1).
+IMAGE_PIPELINE_WORKERS = int(os.getenv('IMAGE_PIPELINE_WORKERS', 0))
+UPLOAD_STAGING_MAX_AGE = int(os.getenv('UPLOAD_STAGING_MAX_AGE', 86400))
@@ -0,0 +1,229 @@
+import os
+from functools import lru_cache
+from hashlib import sha256
+from tempfile import NamedTemporaryFile
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.dispatch import Signal
+from django.utils.deconstruct import deconstructible
+from easy_thumbnails.alias import aliases
+from easy_thumbnails.fields import ThumbnailerImageField
+from easy_thumbnails.files import Thumbnailer, ThumbnailerImageFieldFile
+
+
+CONTENT_DIRECTORY = 'content'
+CONTENT_LOCK_CLASS = 0x636f6e74
+content_deleted = Signal()
+
+
+def lock_content(names, using=DEFAULT_DB_ALIAS):
+    """
+    Takes a transaction level advisory lock per content name, in a fixed
+    order. Rows referring to stored content are written, and unreferenced
+    content is unlinked, only under these locks, so that a delete never
+    removes content a concurrent insert is about to refer to. Advisory
+    locks are a PostgreSQL feature; elsewhere this is a no-op.
+    """
+    connection = connections[using]
+    names = sorted(set(names))
+    if connection.vendor != 'postgresql' or not names:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s, key) FROM '
+                       '(SELECT DISTINCT hashtext(name) AS key FROM unnest(%s::text[]) AS name ORDER BY key) AS keys',
+                       [CONTENT_LOCK_CLASS, names])
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every file under the SHA-256 of its content, so identical uploads
+    share one file whatever name they are saved with. Saving content that is
+    already stored writes nothing.
+    """
+
+    def get_content_name(self, name, content):
+        digest = sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content_hash = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return f'{CONTENT_DIRECTORY}/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{extension}'
+
+    def save(self, name, content, max_length=None):
+        """
+        Stores the content under its content name, holding the content lock
+        until the caller's transaction ends, so the row referring to it must
+        be written in the same transaction.
+        """
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        lock_content([name])
+        if not self.exists(name):
+            self._save(name, content)
+        return name
+
+    def link(self, path, name):
+        """
+        Hard links the local file at path, whose content name is name, into
+        place without copying it, and leaves the file at path alone. Nothing
+        is written when the content is already stored. Falls back to a copy
+        where hard links are not available.
+        """
+        target = self.path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+        try:
+            os.link(path, target)
+        except FileExistsError:
+            pass
+        except OSError:
+            if not os.path.exists(target):
+                with open(path, 'rb') as file:
+                    self._save(name, File(file))
+        return name
+
+    def _save(self, name, content):
+        """
+        Writes to a temporary file next to the target and renames it into
+        place: concurrent saves of the same content all end up with one
+        complete file.
+        """
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as file:
+            if hasattr(content, 'seek'):
+                content.seek(0)
+            for chunk in content.chunks():
+                file.write(chunk)
+        if self.file_permissions_mode is not None:
+            os.chmod(file.name, self.file_permissions_mode)
+        os.replace(file.name, path)
+        return name
+
+
+content_storage = ContentAddressedStorage()
+
+
+@lru_cache(maxsize=None)
+def get_content_fields():
+    return [(model, field) for model in apps.get_models() for field in model._meta.concrete_fields
+            if isinstance(field, ContentAddressedImageField)]
+
+
+def is_referenced(name, exclude=None):
+    """
+    Tells whether a row of any content addressed field still refers to the
+    stored file, leaving out the exclude instance.
+    """
+    for model, field in get_content_fields():
+        rows = model._default_manager.filter(**{field.attname: name})
+        if isinstance(exclude, model) and exclude.pk is not None:
+            rows = rows.exclude(pk=exclude.pk)
+        if rows.exists():
+            return True
+    return False
+
+
+def get_referenced(names):
+    referenced = set()
+    for model, field in get_content_fields():
+        referenced.update(model._default_manager.filter(**{f'{field.attname}__in': names}).
+                          values_list(field.attname, flat=True))
+    return referenced
+
+
+def get_field_thumbnailer(field, name, file=None):
+    thumbnailer = Thumbnailer(file=file, name=name, source_storage=field.storage)
+    thumbnailer.alias_target = f'{field.model._meta.app_label}.{field.model.__name__}.{field.name}'
+    return thumbnailer
+
+
+def get_thumbnail_options(thumbnailer):
+    return {alias: thumbnailer.get_options({**options, 'ALIAS': alias})
+            for alias, options in aliases.all(target=thumbnailer.alias_target).items()}
+
+
+def get_thumbnail_names(thumbnailer):
+    return {thumbnailer.get_thumbnail_name(options, transparent=transparent)
+            for options in get_thumbnail_options(thumbnailer).values() for transparent in (False, True)}
+
+
+def delete_thumbnails(thumbnailer):
+    for name in get_thumbnail_names(thumbnailer):
+        thumbnailer.thumbnail_storage.delete(name)
+
+
+class ContentAddressedFieldFile(ThumbnailerImageFieldFile):
+
+    def delete(self, save=True):
+        """
+        Deletes the file and its alias thumbnails only when no other row
+        refers to them; otherwise just detaches the file from the instance.
+        The check and the unlink happen under the content lock.
+        """
+        if not self:
+            return
+        with transaction.atomic():
+            lock_content([self.name])
+            if not is_referenced(self.name, exclude=self.instance):
+                name = self.name
+                delete_thumbnails(get_field_thumbnailer(self.field, name))
+                super().delete(save)
+                content_deleted.send(sender=self.field.model, names=[name])
+            else:
+                if hasattr(self, '_file'):
+                    self.close()
+                    del self.file
+                self.name = None
+                setattr(self.instance, self.field.attname, self.name)
+                self._committed = False
+                if save:
+                    self.instance.save()
+
+    delete.alters_data = True
+
+
+class ContentAddressedImageField(ThumbnailerImageField):
+    attr_class = ContentAddressedFieldFile
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('storage', content_storage)
+        kwargs.setdefault('db_index', True)
+        super().__init__(*args, **kwargs)
+
+
+def sweep_content(field, names, batch_size=500):
+    """
+    Deletes the stored files no row refers to any more among names, with
+    their alias thumbnails, checking the references of a whole batch at
+    once under the content lock. Files already gone are counted as missing
+    rather than failing.
+    """
+    names = sorted(set(names))
+    counts = {'deleted': 0, 'missing': 0, 'referenced': 0}
+    for start in range(0, len(names), batch_size):
+        batch = names[start:start + batch_size]
+        with transaction.atomic():
+            lock_content(batch)
+            referenced = get_referenced(batch)
+            unreferenced = [name for name in batch if name not in referenced]
+            for name in unreferenced:
+                delete_thumbnails(get_field_thumbnailer(field, name))
+                if field.storage.exists(name):
+                    field.storage.delete(name)
+                    counts['deleted'] += 1
+                else:
+                    counts['missing'] += 1
+            counts['referenced'] += len(referenced)
+            if unreferenced:
+                content_deleted.send(sender=field.model, names=unreferenced)
+    return counts
@@ -0,0 +1,107 @@
+import os
+from tempfile import TemporaryDirectory
+from time import time
+from unittest import mock
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.db import transaction
+from celery import shared_task
+
+from .dispatch import dispatch, batching, fallback, metrics, run_dispatched_tasks
+from .uploads import get_staging_handle, get_staged_path, sweep_staging
+
+
+calls = []
+
+
+@shared_task()
+def record_call_task(value):
+    calls.append(value)
+
+
+@shared_task()
+def fail_call_task(value):
+    raise ValueError(value)
+
+
+@override_settings(DISPATCH_SLOW_PUBLISH=10, DISPATCH_FALLBACK_COOLDOWN=30)
+class DispatchTest(TestCase):
+
+    def setUp(self):
+        calls.clear()
+        metrics.reset()
+        fallback.open_until = 0
+        self.addCleanup(setattr, fallback, 'open_until', 0)
+
+    def test_dispatch_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            dispatch(record_call_task, 1)
+            self.assertEqual([], calls)
+        self.assertEqual([1], calls)
+
+    def test_no_dispatch_after_rollback(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError), transaction.atomic():
+                dispatch(record_call_task, 1)
+                raise ValueError
+        self.assertEqual([], calls)
+        self.assertEqual(0, metrics.snapshot()['publishes'])
+
+    def test_batching_coalesces_calls(self):
+        with mock.patch.object(run_dispatched_tasks, 'apply_async',
+                               wraps=run_dispatched_tasks.apply_async) as apply_async:
+            with batching():
+                with self.captureOnCommitCallbacks(execute=True):
+                    dispatch(record_call_task, 1)
+                    dispatch(record_call_task, 2)
+                    dispatch(record_call_task, 1)
+                self.assertEqual([], calls)
+        apply_async.assert_called_once()
+        self.assertEqual([1, 2], calls)
+        self.assertEqual({'publishes': 1, 'calls': 2, 'fallbacks': 0, 'failures': 0},
+                         {key: value for key, value in metrics.snapshot().items() if not key.startswith('latency')})
+
+    def test_failing_call_does_not_drop_batch(self):
+        with self.assertLogs('retail_order_api.dispatch', 'ERROR'):
+            with batching():
+                with self.captureOnCommitCallbacks(execute=True):
+                    dispatch(fail_call_task, 1)
+                    dispatch(record_call_task, 2)
+        self.assertEqual([2], calls)
+
+    def test_fallback_queue(self):
+        with mock.patch.object(record_call_task, 'apply_async', side_effect=OSError('Connection refused')):
+            with self.captureOnCommitCallbacks(execute=True):
+                dispatch(record_call_task, 1)
+            fallback.queue.join()
+            self.assertEqual([1], calls)
+            self.assertTrue(fallback.is_open)
+            with self.captureOnCommitCallbacks(execute=True):
+                dispatch(record_call_task, 2)
+            fallback.queue.join()
+        self.assertEqual([1, 2], calls)
+        snapshot = metrics.snapshot()
+        self.assertEqual((2, 2, 1), (snapshot['publishes'], snapshot['fallbacks'], snapshot['failures']))
+
+
+class StagingTest(TestCase):
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_staging_handles_are_unique(self):
+        self.assertNotEqual(get_staging_handle('photo.JPG'), get_staging_handle('photo.JPG'))
+        self.assertTrue(get_staging_handle('photo.JPG').endswith('.jpg'))
+
+    def test_sweep_staging(self):
+        stale, fresh = (default_storage.save(get_staging_handle('photo.jpg'), ContentFile(b'data'))
+                        for _ in range(2))
+        os.utime(get_staged_path(stale), (time() - 7200, time() - 7200))
+        self.assertEqual(1, sweep_staging(max_age=3600))
+        self.assertFalse(default_storage.exists(stale))
+        self.assertTrue(default_storage.exists(fresh))
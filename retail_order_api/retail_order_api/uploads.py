@@ -0,0 +1,127 @@
+import os
+from time import time
+from uuid import uuid4
+from celery import shared_task
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.http.multipartparser import MultiPartParser as DjangoMultiPartParser, MultiPartParserError
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+STAGING_DIRECTORY = 'staging'
+
+
+def get_staging_handle(name):
+    return f'{STAGING_DIRECTORY}/{uuid4().hex}{os.path.splitext(name)[1].lower()}'
+
+
+def get_staged_path(handle):
+    return default_storage.path(handle)
+
+
+class StagedUploadedFile(UploadedFile):
+    """
+    An upload streamed into its own uniquely named file of the staging
+    directory of the media storage. The file is removed when the request is
+    closed unless its handle was claimed to be passed on to a task.
+    """
+
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        self.handle = get_staging_handle(name)
+        self.claimed = False
+        path = get_staged_path(self.handle)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        super().__init__(open(path, 'xb+'), name, content_type, size, charset, content_type_extra)
+
+    def temporary_file_path(self):
+        return self.file.name
+
+    def claim(self):
+        self.claimed = True
+        return self.handle
+
+    def close(self):
+        try:
+            return self.file.close()
+        finally:
+            if not self.claimed:
+                default_storage.delete(self.handle)
+
+
+class StagingUploadHandler(FileUploadHandler):
+    """
+    Streams every uploaded file straight into the staging directory, whatever
+    its size, so that it is written to disk once and then only linked into place.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = StagedUploadedFile(self.file_name, self.content_type, 0, self.charset,
+                                       self.content_type_extra)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+
+
+class StagingMultiPartParser(MultiPartParser):
+    """
+    Multipart parser that hands the files of the request to the
+    StagingUploadHandler instead of the project's upload handlers.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        request = parser_context['request']
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        meta = request.META.copy()
+        meta['CONTENT_TYPE'] = media_type
+        try:
+            parser = DjangoMultiPartParser(meta, stream, [StagingUploadHandler(request)], encoding)
+            data, files = parser.parse()
+            return DataAndFiles(data, files)
+        except MultiPartParserError as exc:
+            raise ParseError(f'Multipart form parse error - {exc}')
+
+
+def discard_staged(handles):
+    for handle in handles:
+        default_storage.delete(handle)
+
+
+def sweep_staging(max_age=None):
+    """
+    Removes the staged files older than UPLOAD_STAGING_MAX_AGE seconds, left
+    behind by tasks that never ran to completion, and returns their number.
+    """
+    if max_age is None:
+        max_age = settings.UPLOAD_STAGING_MAX_AGE
+    if not default_storage.exists(STAGING_DIRECTORY):
+        return 0
+    deadline = time() - max_age
+    stale = []
+    for name in default_storage.listdir(STAGING_DIRECTORY)[1]:
+        handle = f'{STAGING_DIRECTORY}/{name}'
+        try:
+            if os.path.getmtime(get_staged_path(handle)) < deadline:
+                stale.append(handle)
+        except FileNotFoundError:
+            pass
+    discard_staged(stale)
+    return len(stale)
+
+
+@shared_task()
+def sweep_staging_task():
+    return sweep_staging()
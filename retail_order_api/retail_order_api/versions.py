@@ -0,0 +1,36 @@
+from hashlib import md5
+from time import time_ns
+from django.core.cache import cache
+from django.db import transaction
+
+
+def get_versions(*keys):
+    cache_keys = [f'version:{key}' for key in keys]
+    versions = cache.get_many(cache_keys)
+    missing = {key: time_ns() for key in cache_keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in cache_keys]
+
+
+def bump_versions(keys):
+    """
+    Moves the version counters on once the current transaction commits, so
+    a new version is never paired with data that is not visible yet.
+    """
+    cache_keys = [f'version:{key}' for key in keys]
+    transaction.on_commit(lambda: cache.set_many(dict.fromkeys(cache_keys, time_ns()), None))
+
+
+def get_etag(request, *keys, stamp=None):
+    """
+    Strong ETag of a GET response derived from the version counters it
+    depends on, the optional stamp, such as a row's updated_at, and the
+    full path with the query string.
+    """
+    parts = [str(version) for version in get_versions(*keys)]
+    if stamp is not None:
+        parts.append(stamp.isoformat())
+    parts.append(request.get_full_path())
+    return md5('|'.join(parts).encode()).hexdigest()
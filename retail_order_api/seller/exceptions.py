@@ -0,0 +1,2 @@
+class PriceListFormatError(Exception):
+    pass
@@ -0,0 +1,204 @@
+from django.db import transaction
+
+from products.models import Category, Product, ProductCard, Parameter, ProductParameter
+from products.search import update_search_documents
+from products.catalogue import refresh_catalogue
+from buyer.reservations import lock_holds, trim_holds
+
+
+CARD_FIELDS = ('model', 'description', 'price', 'price_rrc', 'quantity', 'status')
+
+
+def get_card_status(quantity):
+    return 'sold' if quantity == 0 else 'in_stock'
+
+
+class PriceListImporter:
+    """
+    Imports a validated price list with a fixed number of set-based queries
+    per batch of goods instead of several queries per good.
+
+    In diff mode only new and changed cards and parameters are written.
+    With withdraw_missing the shop's cards absent from the price list are
+    marked withdrawn by withdraw_missing_cards().
+    """
+    batch_size = 1000
+
+    def __init__(self, shop, diff=False, withdraw_missing=False):
+        self.shop = shop
+        self.diff = diff
+        self.withdraw_missing = withdraw_missing
+        self.counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        self.seen = set()
+
+    def run(self, categories, goods):
+        with transaction.atomic():
+            self.import_categories(categories)
+            for start in range(0, len(goods), self.batch_size):
+                self.import_goods(goods[start:start + self.batch_size])
+            if self.withdraw_missing:
+                self.withdraw_missing_cards()
+        return self.counts
+
+    def import_categories(self, categories):
+        Category.objects.bulk_create(
+            [Category(id=category['id'], name=category['name']) for category in categories],
+            ignore_conflicts=True
+        )
+        self.shop.categories.add(*[category['id'] for category in categories])
+
+    def get_products(self, goods):
+        products = {good['name']: good['category'] for good in reversed(goods)}
+        Product.objects.bulk_create(
+            [Product(name=name, category_id=category_id) for name, category_id in products.items()],
+            ignore_conflicts=True
+        )
+        return dict(Product.objects.filter(name__in=products).values_list('name', 'id'))
+
+    def get_parameters(self, goods):
+        names = {name for good in goods for name in good.get('parameters', {})}
+        parameters = {}
+        for name, parameter_id in Parameter.objects.filter(name__in=names).order_by('-id').values_list('name', 'id'):
+            parameters[name] = parameter_id
+        missing = names - parameters.keys()
+        if missing:
+            Parameter.objects.bulk_create([Parameter(name=name) for name in missing])
+            parameters.update(Parameter.objects.filter(name__in=missing).values_list('name', 'id'))
+        return parameters
+
+    def get_existing_cards(self, keys):
+        cards = ProductCard.objects.filter(shop=self.shop, product_code__in={code for code, product_id in keys})
+        held = lock_holds(list(cards.values_list('id', flat=True)))
+        cards = cards.only('id', 'product_code', 'product_id', *CARD_FIELDS)
+        existing_cards = {(card.product_code, card.product_id): card for card in cards
+                          if (card.product_code, card.product_id) in keys}
+        existing_parameters = {}
+        for card_id, parameter_id, value in (ProductParameter.objects.
+                filter(product_card_id__in=[card.id for card in existing_cards.values()]).
+                values_list('product_card_id', 'parameter_id', 'value')):
+            existing_parameters.setdefault(card_id, {})[parameter_id] = value
+        return existing_cards, existing_parameters, held
+
+    def build_cards(self, goods, products, parameters):
+        cards = {}
+        cards_parameters = {}
+        for good in goods:
+            key = (good['id'], products[good['name']])
+            cards[key] = ProductCard(
+                product_code=good['id'], product_id=key[1], shop=self.shop,
+                model=good['model'],
+                description=good.get('description'),
+                price=good['price'],
+                price_rrc=good['price_rrc'],
+                quantity=good['quantity'],
+                status=get_card_status(good['quantity'])
+            )
+            cards_parameters.setdefault(key, {}).update(
+                {parameters[name]: value for name, value in good.get('parameters', {}).items()})
+        return cards, cards_parameters
+
+    def subtract_holds(self, cards, existing_cards, held):
+        """
+        Holds are taken out of the cards' quantity, so the supplier's figure
+        is written net of the holds outstanding on the card. Holds exceeding
+        the new figure are trimmed down to it. Returns the ids of the cards
+        whose holds were trimmed.
+        """
+        limits = {}
+        for key, card in cards.items():
+            existing_card = existing_cards.get(key)
+            card_held = held.get(existing_card.id, 0) if existing_card else 0
+            if not card_held:
+                continue
+            if card_held > card.quantity:
+                limits[existing_card.id] = card.quantity
+            card.quantity = max(card.quantity - card_held, 0)
+            card.status = get_card_status(card.quantity)
+        trim_holds(limits)
+        return list(limits)
+
+    def is_changed(self, card, card_parameters, existing_card, existing_parameters):
+        if any(getattr(card, field) != getattr(existing_card, field) for field in CARD_FIELDS):
+            return True
+        return any(existing_parameters.get(parameter_id) != value
+                   for parameter_id, value in card_parameters.items())
+
+    def compare(self, cards, cards_parameters, existing_cards, existing_parameters):
+        changed = set()
+        for key, card in cards.items():
+            existing_card = existing_cards.get(key)
+            if existing_card is None:
+                self.counts['inserted'] += 1
+                changed.add(key)
+            elif self.is_changed(card, cards_parameters[key], existing_card,
+                                 existing_parameters.get(existing_card.id, {})):
+                self.counts['updated'] += 1
+                changed.add(key)
+            else:
+                self.counts['unchanged'] += 1
+        return changed
+
+    def get_delta(self, changed, cards, cards_parameters, existing_cards, existing_parameters):
+        delta_cards = {key: card for key, card in cards.items() if key in changed}
+        delta_parameters = {}
+        for key in changed:
+            current_parameters = {}
+            if key in existing_cards:
+                current_parameters = existing_parameters.get(existing_cards[key].id, {})
+            delta_parameters[key] = {parameter_id: value for parameter_id, value in cards_parameters[key].items()
+                                     if current_parameters.get(parameter_id) != value}
+        return delta_cards, delta_parameters
+
+    def save_cards(self, cards):
+        if not cards:
+            return {}
+        ProductCard.objects.bulk_create(
+            cards.values(),
+            update_conflicts=True,
+            unique_fields=['product_code', 'product', 'shop'],
+            update_fields=CARD_FIELDS
+        )
+        cards_ids = (ProductCard.objects.
+                     filter(shop=self.shop, product_code__in={code for code, product_id in cards}).
+                     values_list('product_code', 'product_id', 'id'))
+        return {(code, product_id): card_id for code, product_id, card_id in cards_ids
+                if (code, product_id) in cards}
+
+    def save_parameters(self, cards_ids, cards_parameters):
+        ProductParameter.objects.bulk_create(
+            [ProductParameter(product_card_id=cards_ids[key], parameter_id=parameter_id, value=value)
+             for key, card_parameters in cards_parameters.items()
+             for parameter_id, value in card_parameters.items()],
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=['product_card', 'parameter'],
+            update_fields=['value']
+        )
+
+    def import_goods(self, goods):
+        if self.withdraw_missing:
+            self.seen.update((good['id'], good['name']) for good in goods)
+        products = self.get_products(goods)
+        parameters = self.get_parameters(goods)
+        cards, cards_parameters = self.build_cards(goods, products, parameters)
+        existing_cards, existing_parameters, held = self.get_existing_cards(cards.keys())
+        trimmed = self.subtract_holds(cards, existing_cards, held)
+        changed = self.compare(cards, cards_parameters, existing_cards, existing_parameters)
+        if self.diff:
+            cards, cards_parameters = self.get_delta(changed, cards, cards_parameters,
+                                                     existing_cards, existing_parameters)
+        cards_ids = self.save_cards(cards)
+        self.save_parameters(cards_ids, cards_parameters)
+        update_search_documents(cards_ids.values())
+        refresh_catalogue({*cards_ids.values(), *trimmed})
+        return cards_ids
+
+    def withdraw_missing_cards(self):
+        cards = (ProductCard.objects.filter(shop=self.shop).exclude(status='withdrawn').
+                 values_list('id', 'product_code', 'product__name'))
+        missing_ids = [card_id for card_id, code, name in cards.iterator() if (code, name) not in self.seen]
+        for start in range(0, len(missing_ids), self.batch_size):
+            (ProductCard.objects.filter(id__in=missing_ids[start:start + self.batch_size]).
+             update(status='withdrawn'))
+        refresh_catalogue(missing_ids)
+        return len(missing_ids)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Subquery, OuterRef
+
+from products.models import ProductCard
+from buyer.models import OrderPosition
+
+
+class Command(BaseCommand):
+    help = 'Fills the shop of order positions created before it was stored on them.'
+    batch_size = 10000
+
+    def handle(self, *args, **options):
+        shop = ProductCard.objects.filter(id=OuterRef('product_card_id')).values('shop_id')[:1]
+        positions = OrderPosition.objects.filter(shop__isnull=True).order_by('id')
+        updated = 0
+        last_id = 0
+        while True:
+            ids = list(positions.filter(id__gt=last_id).values_list('id', flat=True)[:self.batch_size])
+            if not ids:
+                break
+            updated += OrderPosition.objects.filter(id__in=ids).update(shop=Subquery(shop))
+            last_id = ids[-1]
+        self.stdout.write(f'Order positions updated: {updated}, left without a shop: {positions.count()}')
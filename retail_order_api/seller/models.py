@@ -17,4 +17,52 @@ class Shop(models.Model):
         ordering = ('-name',)
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+
+IMPORT_STATUS_CHOICES = (
+    ('pending', 'Pending'),
+    ('running', 'Running'),
+    ('done', 'Done'),
+    ('failed', 'Failed'),
+)
+
+PRICE_LIST_FORMAT_CHOICES = (
+    ('yaml', 'YAML'),
+    ('jsonl', 'JSON lines'),
+)
+
+
+class PriceListImport(models.Model):
+
+    @property
+    def progress(self):
+        if self.status == 'done':
+            return 100
+        if not self.total:
+            return None if self.status == 'running' else 0
+        return round(self.processed * 100 / self.total)
+
+    user = models.ForeignKey(User, related_name='price_list_imports', on_delete=models.CASCADE)
+    url = models.URLField()
+    format = models.CharField(choices=PRICE_LIST_FORMAT_CHOICES, max_length=5, default='yaml')
+    diff = models.BooleanField(default=False)
+    withdraw_missing = models.BooleanField(default=False)
+    status = models.CharField(choices=IMPORT_STATUS_CHOICES, max_length=7, default='pending')
+    total = models.PositiveIntegerField(null=True, blank=True)
+    processed = models.PositiveIntegerField(default=0)
+    inserted = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    unchanged = models.PositiveIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0)
+    withdrawn = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    timings = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = 'Price list import'
+        verbose_name_plural = 'Price list imports'
+        ordering = ('-created_at',)
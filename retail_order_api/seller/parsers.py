@@ -0,0 +1,72 @@
+import io
+import json
+from yaml import SafeLoader
+from yaml.events import DocumentStartEvent, MappingStartEvent, MappingEndEvent, SequenceStartEvent, SequenceEndEvent
+
+from .exceptions import PriceListFormatError
+
+
+def parse_yaml(stream):
+    """
+    Yields the price list header (shop and categories) and then the goods one
+    by one, so only a single good is held in memory at a time. The goods must
+    be the last key of the document.
+    """
+    loader = SafeLoader(stream)
+    try:
+        loader.get_event()
+        if loader.check_event(DocumentStartEvent):
+            loader.get_event()
+        if not loader.check_event(MappingStartEvent):
+            raise PriceListFormatError('The price list must be a mapping.')
+        loader.get_event()
+        header = {}
+        goods_found = False
+        while not loader.check_event(MappingEndEvent):
+            key = loader.construct_document(loader.compose_node(None, None))
+            if goods_found:
+                raise PriceListFormatError('The goods must be the last key of the price list.')
+            if key != 'goods':
+                header[key] = loader.construct_document(loader.compose_node(None, None))
+                continue
+            goods_found = True
+            yield header
+            if not loader.check_event(SequenceStartEvent):
+                loader.construct_document(loader.compose_node(None, None))
+                continue
+            loader.get_event()
+            while not loader.check_event(SequenceEndEvent):
+                yield loader.construct_document(loader.compose_node(None, None))
+            loader.get_event()
+        if not goods_found:
+            yield header
+    finally:
+        loader.dispose()
+
+
+def parse_json_lines(stream):
+    """
+    The first line holds the header object, every following line holds a good.
+    """
+    lines = io.TextIOWrapper(stream, encoding='utf-8')
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as exc:
+            raise PriceListFormatError(f'Line {number}: {exc}.')
+
+
+PARSERS = {
+    'yaml': parse_yaml,
+    'jsonl': parse_json_lines,
+}
+
+
+def read_price_list(stream, format='yaml'):
+    items = PARSERS[format](stream)
+    header = next(items, None)
+    if not isinstance(header, dict):
+        raise PriceListFormatError('The price list must start with the shop and the categories.')
+    return header, items
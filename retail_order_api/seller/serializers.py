@@ -1,51 +1,58 @@
 from rest_framework import serializers
+from django.db.models import Q
 import requests
 
 from products.models import Category, ProductCard, Image
-from buyer.models import OrderPosition, Order, Address
-from .models import Shop
+from buyer.models import OrderPosition, Order, Address, STATUS_CHOICES
+from .models import Shop, PriceListImport, PRICE_LIST_FORMAT_CHOICES
 
 class ShopPricesUrlSerializer(serializers.Serializer):
     url = serializers.URLField()
+    format = serializers.ChoiceField(choices=PRICE_LIST_FORMAT_CHOICES, default='yaml')
+    diff = serializers.BooleanField(default=False)
+    withdraw_missing = serializers.BooleanField(default=False)
 
 
 class CategorySerializer(serializers.Serializer):
     id = serializers.IntegerField(min_value=1)
     name = serializers.CharField(max_length=80)
 
-    def validate(self, data):
-        try:
-            category = Category.objects.get(name=data['name'])
-            if category.id != data['id']:
-                raise serializers.ValidationError(f"Category '{category.name}' already exists with '{category.id}' id.")
-        except Category.DoesNotExist:
-            pass
-        return data
 
+class ShopPricesSerializer(serializers.Serializer):
+    shop = serializers.CharField()
+    categories = CategorySerializer(many=True)
 
-class GoodSerializer(serializers.ModelSerializer):
+    def validate_categories(self, categories):
+        names = {category['name']: category['id'] for category in categories}
+        ids = {category['id']: category['name'] for category in categories}
+        errors = []
+        for category in Category.objects.filter(Q(name__in=names) | Q(id__in=ids)):
+            if (names.get(category.name, category.id) != category.id
+                    or ids.get(category.id, category.name) != category.name):
+                errors.append(f"Category '{category.name}' already exists with '{category.id}' id.")
+        if errors:
+            raise serializers.ValidationError(errors)
+        return categories
 
-    id = serializers.IntegerField(min_value=1)
-    category = serializers.IntegerField(min_value=1)
-    name = serializers.CharField(max_length=80)
-    parameters = serializers.DictField(child=serializers.CharField(), allow_empty=True, required=False)
+
+class PriceListImportNewSerializer(serializers.ModelSerializer):
 
     class Meta:
-        model = ProductCard
-        fields = ('id', 'category', 'model', 'name', 'price', 'price_rrc', 'quantity', 'parameters')
+        model = PriceListImport
+        fields = ('id',)
 
 
-class ShopPricesSerializer(serializers.Serializer):
-    shop = serializers.CharField()
-    categories = CategorySerializer(many=True)
-    goods = GoodSerializer(many=True)
+class PriceListImportSerializer(serializers.ModelSerializer):
+    progress = serializers.IntegerField(read_only=True, allow_null=True)
+    created_at = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S", read_only=True)
+    started_at = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S", read_only=True)
+    finished_at = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S", read_only=True)
 
-    def validate(self, data):
-        categories_id = [category['id'] for category in data['categories']]
-        for good in data['goods']:
-            if good['category'] not in categories_id:
-                raise serializers.ValidationError(f"Good's categories must correspond to the listed categories.")
-        return data
+    class Meta:
+        model = PriceListImport
+        fields = ('id', 'url', 'format', 'diff', 'withdraw_missing', 'status', 'progress', 'total', 'processed',
+                  'inserted', 'updated', 'unchanged', 'rejected', 'withdrawn', 'errors', 'timings',
+                  'created_at', 'started_at', 'finished_at')
 
 
 class ShopStatusSerializer(serializers.ModelSerializer):
@@ -58,10 +65,45 @@ class ShopStatusSerializer(serializers.ModelSerializer):
 
 class OrdersSerializer(serializers.ModelSerializer):
     created_at = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S", read_only=True)
+    items_count = serializers.IntegerField(read_only=True)
+    subtotal = serializers.DecimalField(max_digits=15, decimal_places=2, read_only=True)
 
     class Meta:
         model = Order
-        fields = ('id', 'created_at')
+        fields = ('id', 'created_at', 'status', 'items_count', 'subtotal')
+
+
+class OrdersPageSerializer(serializers.Serializer):
+    next = serializers.URLField(allow_null=True)
+    previous = serializers.URLField(allow_null=True)
+    results = OrdersSerializer(many=True)
+
+
+MAX_ORDERS_STATUS_BATCH = 10000
+
+
+class OrdersStatusSerializer(serializers.Serializer):
+    orders = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False,
+                                   max_length=MAX_ORDERS_STATUS_BATCH)
+    status = serializers.ChoiceField(choices=[choice for choice in STATUS_CHOICES if choice[0] != 'new'])
+
+
+REFUSAL_REASON_CHOICES = (
+    ('not_found', 'The order has no positions of the shop'),
+    ('transition', 'The order may not go to the status'),
+    ('shared', 'The order has positions of other shops'),
+)
+
+
+class RefusedOrderSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.CharField(allow_null=True)
+    reason = serializers.ChoiceField(choices=REFUSAL_REASON_CHOICES)
+
+
+class OrdersStatusResultSerializer(serializers.Serializer):
+    updated = serializers.ListField(child=serializers.IntegerField())
+    refused = RefusedOrderSerializer(many=True)
 
 
 class OrderPositionSerializer(serializers.ModelSerializer):
@@ -89,16 +131,24 @@ class ImagesPostSerializer(serializers.Serializer):
     images = serializers.ListField(child=serializers.ImageField(), min_length=1, max_length=6)
 
 
-class ImagesDeleteSerializer(serializers.ModelSerializer):
+MAX_IMAGES_DELETE_BATCH = 1000
 
-    class Meta:
-        model = ProductCard
-        fields = ('images',)
+
+class ImagesDeleteSerializer(serializers.Serializer):
+    images = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False,
+                                   max_length=MAX_IMAGES_DELETE_BATCH)
 
     def validate_images(self, images):
         product_card = self.context['product_card']
-        for image in images:
-            if image.product_card != product_card:
+        cards = dict(Image.objects.filter(id__in=images).values_list('id', 'product_card_id'))
+        for image_id in images:
+            if image_id not in cards:
+                raise serializers.ValidationError(f"The image with id '{image_id}' does not exist")
+            if cards[image_id] != product_card.id:
                 raise serializers.ValidationError(
-                    f"The image with id '{image.id}' does not belong to the product card")
-        return images
+                    f"The image with id '{image_id}' does not belong to the product card")
+        return list(dict.fromkeys(images))
+
+
+class ImagesDeleteResultSerializer(serializers.Serializer):
+    deleted = serializers.IntegerField()
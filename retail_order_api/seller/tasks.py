@@ -1,28 +1,113 @@
+import logging
 from celery import shared_task
-from django.core.files.storage import FileSystemStorage
-from django.core.files import File
-from pathlib import Path
+from django.db import transaction
+from django.utils import timezone
+from time import monotonic
+import requests
+from urllib3.exceptions import HTTPError as StreamError
+from yaml import YAMLError
 
-from products.models import Image, ProductCard
+from products.models import ProductCard
+from products.images import ingest_images
+from .models import Shop, PriceListImport
+from .serializers import ShopPricesSerializer
+from .validators import GoodsValidator
+from .importer import PriceListImporter
+from .parsers import read_price_list
+from .exceptions import PriceListFormatError
 
 
-@shared_task()
-def save_images(product_card_id, images_names):
-    product_card = ProductCard.objects.get(id=product_card_id)
-    storage = FileSystemStorage()
-    images_objects = []
-    for image_name in images_names:
-        path = storage.path(image_name)
-        path_object = Path(path)
-        with path_object.open(mode='rb') as file:
-            image = File(file, name=f'{product_card_id}_{image_name}')
-            image_object = Image(product_card=product_card, image=image)
-            image_object.save()
-            images_objects.append(image_object)
-            storage.delete(image_name)
+logger = logging.getLogger(__name__)
+DOWNLOAD_TIMEOUT = (10, 300)
+MAX_REPORTED_ERRORS = 1000
 
 
 @shared_task()
-def delete_images(images_ids):
-    for image_id in images_ids:
-        Image.objects.get(id=image_id).delete()
+def save_images(product_card_id, handles):
+    product_card = ProductCard.objects.select_related('shop').get(id=product_card_id)
+    return ingest_images(product_card, handles)
+
+
+def fail_import(job, errors):
+    job.status = 'failed'
+    job.errors = errors
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'errors', 'finished_at'])
+
+
+def save_batch(job, importer, rows, validator):
+    goods, errors = validator.validate(rows)
+    with transaction.atomic():
+        importer.import_goods(goods)
+        job.processed = rows[-1][0] + 1
+        job.inserted = importer.counts['inserted']
+        job.updated = importer.counts['updated']
+        job.unchanged = importer.counts['unchanged']
+        job.rejected += len(errors)
+        job.errors = (job.errors + errors)[:MAX_REPORTED_ERRORS]
+        job.save(update_fields=['processed', 'inserted', 'updated', 'unchanged', 'rejected', 'errors'])
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def import_price_list_task(job_id):
+    job = PriceListImport.objects.get(id=job_id)
+    if job.status in ('done', 'failed'):
+        return
+    job.status = 'running'
+    job.started_at = job.started_at or timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+
+    started = monotonic()
+    try:
+        response = requests.get(job.url, timeout=DOWNLOAD_TIMEOUT, stream=True)
+        response.raise_for_status()
+    except requests.RequestException as exc:
+        return fail_import(job, [{'url': f'{exc}'}])
+    response.raw.decode_content = True
+    job.timings['connect'] = round(monotonic() - started, 3)
+
+    with response:
+        try:
+            header, goods = read_price_list(response.raw, job.format)
+            serializer = ShopPricesSerializer(data=header)
+            if not serializer.is_valid():
+                return fail_import(job, [serializer.errors])
+            validated_data = serializer.validated_data
+            shop, created = Shop.objects.get_or_create(name=validated_data['shop'], user=job.user)
+            importer = PriceListImporter(shop, diff=job.diff, withdraw_missing=job.withdraw_missing)
+            importer.counts = {'inserted': job.inserted, 'updated': job.updated, 'unchanged': job.unchanged}
+            importer.import_categories(validated_data['categories'])
+            validator = GoodsValidator(category['id'] for category in validated_data['categories'])
+
+            rows = []
+            row = -1
+            for row, good in enumerate(goods):
+                if row < job.processed:
+                    if job.withdraw_missing and isinstance(good, dict):
+                        importer.seen.add((good.get('id'), good.get('name')))
+                    continue
+                rows.append((row, good))
+                if len(rows) == importer.batch_size:
+                    save_batch(job, importer, rows, validator)
+                    rows = []
+            if rows:
+                save_batch(job, importer, rows, validator)
+
+            with transaction.atomic():
+                if job.withdraw_missing:
+                    job.withdrawn = importer.withdraw_missing_cards()
+                job.total = row + 1
+                job.timings['import'] = round(monotonic() - started, 3)
+                job.status = 'done'
+                job.finished_at = timezone.now()
+                job.save(update_fields=['withdrawn', 'total', 'status', 'timings', 'finished_at'])
+        except YAMLError as exc:
+            problem = getattr(exc, 'problem', None) or f'{exc}'
+            return fail_import(job, [{'yaml_error': f'{problem.capitalize()}.'}])
+        except PriceListFormatError as exc:
+            return fail_import(job, [{'format_error': f'{exc}'}])
+        except StreamError as exc:
+            return fail_import(job, [{'url': f'{exc}'}])
+        except Exception as exc:
+            logger.exception('Price list import %s failed.', job.id)
+            return fail_import(job, [{'error': f'{exc}'}])
@@ -1,3 +1,471 @@
+from unittest import mock
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.db.models import F
+from rest_framework.test import APITestCase
+from rest_framework.authtoken.models import Token
+from rest_framework import status
+from django.urls import reverse
+from django.core import mail
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test.utils import override_settings
+from tempfile import TemporaryDirectory
+from decimal import Decimal
+from PIL import Image as PILImage
+import io
 
-# Create your tests here.
+from products.models import Category, Product, ProductCard, ProductParameter, Image, Thumbnail, CatalogueEntry
+from products.images import ingest_images
+from retail_order_api.uploads import STAGING_DIRECTORY
+from .models import Shop, PriceListImport
+from buyer.models import Order, OrderPosition, Address
+from .importer import PriceListImporter
+from .tasks import import_price_list_task
+from .parsers import read_price_list
+from .exceptions import PriceListFormatError
+from .validators import GoodsValidator
+from .serializers import ShopPricesSerializer
+
+User = get_user_model()
+
+
+class PriceListImporterTest(TestCase):
+
+    def setUp(self):
+        seller = User.objects.create_user(first_name='Ivan', last_name='Ivanov', email='ivan.ivanov@gmail.com',
+                                          is_active=True, type='seller', password='12345678')
+        self.shop = Shop.objects.create(name='Связной', user=seller)
+        self.categories = [{'id': 224, 'name': 'Смартфоны'}, {'id': 15, 'name': 'Аксессуары'}]
+        self.goods = [
+            {'id': 4216292, 'category': 224, 'model': 'apple/iphone/xs-max',
+             'name': 'Смартфон Apple iPhone XS Max 512GB (золотистый)',
+             'price': Decimal('110000'), 'price_rrc': Decimal('116990'), 'quantity': 14,
+             'parameters': {'Диагональ (дюйм)': '6.5', 'Цвет': 'золотистый'}},
+            {'id': 4117350, 'category': 15, 'model': 'apple/airpods', 'name': 'Наушники Apple AirPods',
+             'price': Decimal('11000'), 'price_rrc': Decimal('12990'), 'quantity': 0,
+             'parameters': {'Цвет': 'белый'}},
+        ]
+
+    def test_import_new_price_list(self):
+        counts = PriceListImporter(self.shop).run(self.categories, self.goods)
+        self.assertEqual({'inserted': 2, 'updated': 0, 'unchanged': 0}, counts)
+        self.assertEqual(2, self.shop.categories.count())
+        self.assertEqual(2, Product.objects.count())
+        product_card = ProductCard.objects.get(product_code=4216292, shop=self.shop)
+        self.assertEqual('in_stock', product_card.status)
+        self.assertEqual(Decimal('110000.00'), product_card.price)
+        self.assertEqual(2, product_card.parameters.count())
+        self.assertEqual('sold', ProductCard.objects.get(product_code=4117350).status)
+
+    def test_reimport_price_list(self):
+        PriceListImporter(self.shop).run(self.categories, self.goods)
+        self.goods[0]['price'] = Decimal('100000')
+        self.goods[1]['parameters'] = {'Цвет': 'черный'}
+        self.goods.append({'id': 4244124, 'category': 224, 'model': 'apple/iphone/xr',
+                           'name': 'Смартфон Apple iPhone XR 256GB (красный)',
+                           'price': Decimal('65000'), 'price_rrc': Decimal('69990'), 'quantity': 9})
+        counts = PriceListImporter(self.shop).run(self.categories, self.goods)
+        self.assertEqual({'inserted': 1, 'updated': 2, 'unchanged': 0}, counts)
+        counts = PriceListImporter(self.shop).run(self.categories, self.goods)
+        self.assertEqual({'inserted': 0, 'updated': 0, 'unchanged': 3}, counts)
+        self.assertEqual(3, ProductCard.objects.filter(shop=self.shop).count())
+        self.assertEqual(Decimal('100000.00'), ProductCard.objects.get(product_code=4216292).price)
+        self.assertEqual('черный', ProductParameter.objects.get(product_card__product_code=4117350).value)
+        self.assertEqual(2, Category.objects.count())
+
+    def test_diff_import_writes_only_changed_cards(self):
+        PriceListImporter(self.shop).run(self.categories, self.goods)
+        with CaptureQueriesContext(connection) as context:
+            counts = PriceListImporter(self.shop, diff=True).run(self.categories, self.goods)
+        self.assertEqual({'inserted': 0, 'updated': 0, 'unchanged': 2}, counts)
+        self.assertFalse([query for query in context.captured_queries
+                          if 'INSERT INTO "products_productcard"' in query['sql']
+                          or 'INSERT INTO "products_productparameter"' in query['sql']])
+        self.goods[1]['quantity'] = 5
+        counts = PriceListImporter(self.shop, diff=True).run(self.categories, self.goods)
+        self.assertEqual({'inserted': 0, 'updated': 1, 'unchanged': 1}, counts)
+        product_card = ProductCard.objects.get(product_code=4117350)
+        self.assertEqual(5, product_card.quantity)
+        self.assertEqual('in_stock', product_card.status)
+
+    def test_withdraw_missing_cards(self):
+        PriceListImporter(self.shop).run(self.categories, self.goods)
+        importer = PriceListImporter(self.shop, diff=True, withdraw_missing=True)
+        importer.run(self.categories, self.goods[:1])
+        self.assertEqual('withdrawn', ProductCard.objects.get(product_code=4117350).status)
+        self.assertEqual('in_stock', ProductCard.objects.get(product_code=4216292).status)
+        counts = PriceListImporter(self.shop, diff=True, withdraw_missing=True).run(self.categories, self.goods)
+        self.assertEqual({'inserted': 0, 'updated': 1, 'unchanged': 1}, counts)
+        self.assertEqual('sold', ProductCard.objects.get(product_code=4117350).status)
+
+
+class ShopPricesTest(APITestCase):
+
+    def setUp(self):
+        self.url = reverse('seller:shop_prices')
+        seller_data = {'first_name': 'Ivan', 'last_name': 'Ivanov', 'email': 'ivan.ivanov@gmail.com',
+                       'is_active': True, 'type': 'seller', 'password': '12345678'}
+        other_seller_data = {'first_name': 'Petr', 'last_name': 'Petrov', 'email': 'petr.petrov@gmail.com',
+                             'is_active': True, 'type': 'seller', 'password': '12345678'}
+        self.seller = User.objects.create_user(**seller_data)
+        self.seller_auth_token = Token.objects.create(user=self.seller)
+        other_seller = User.objects.create_user(**other_seller_data)
+        self.other_seller_auth_token = Token.objects.create(user=other_seller)
+        self.data = {'url': 'https://raw.githubusercontent.com/netology-code/python-final-diplom/master/data/shop1.yaml'}
+
+    def test_post_prices_and_get_job(self):
+        response = self.client.post(self.url, headers={'Authorization': f'Token {self.seller_auth_token}'},
+                                    data=self.data)
+        self.assertEqual(status.HTTP_202_ACCEPTED, response.status_code)
+        job_id = response.json()['id']
+        response = self.client.get(reverse('seller:shop_prices_job', args=[job_id]),
+                                   headers={'Authorization': f'Token {self.seller_auth_token}'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        job = response.json()
+        self.assertEqual('done', job['status'])
+        self.assertEqual(100, job['progress'])
+        self.assertEqual(job['total'], job['inserted'])
+        self.assertEqual(job['total'], ProductCard.objects.filter(shop__user=self.seller).count())
+
+    def test_get_job_of_other_seller(self):
+        job = PriceListImport.objects.create(user=self.seller, url=self.data['url'])
+        response = self.client.get(reverse('seller:shop_prices_job', args=[job.id]),
+                                   headers={'Authorization': f'Token {self.other_seller_auth_token}'})
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_resume_job_from_checkpoint(self):
+        job = PriceListImport.objects.create(user=self.seller, url=self.data['url'], status='running', processed=2)
+        import_price_list_task(job.id)
+        job.refresh_from_db()
+        self.assertEqual('done', job.status)
+        self.assertEqual(job.total - 2, job.inserted)
+        self.assertEqual(job.total - 2, ProductCard.objects.filter(shop__user=self.seller).count())
+
+
+    def run_import_of(self, content, **options):
+        job = PriceListImport.objects.create(user=self.seller, url=self.data['url'], **options)
+        response = mock.MagicMock(raw=io.BytesIO(content))
+        response.__enter__.return_value = response
+        with mock.patch('seller.tasks.requests.get', return_value=response):
+            import_price_list_task(job.id)
+        job.refresh_from_db()
+        return job
+
+    def test_fail_job_on_undecodable_feed(self):
+        job = self.run_import_of(b'shop: \xff\xfe\n')
+        self.assertEqual('failed', job.status)
+        self.assertIn('yaml_error', job.errors[0])
+
+    def test_fail_job_on_unexpected_error(self):
+        with mock.patch('seller.tasks.PriceListImporter.import_categories', side_effect=RuntimeError('Disk full')), \
+                self.assertLogs('seller.tasks', 'ERROR'):
+            job = self.run_import_of(b'shop: a\ncategories: []\ngoods: []\n')
+        self.assertEqual(('failed', [{'error': 'Disk full'}]), (job.status, job.errors))
+
+    def test_fail_job_on_error_while_finishing(self):
+        with mock.patch('seller.tasks.PriceListImporter.withdraw_missing_cards',
+                        side_effect=RuntimeError('Disk full')), self.assertLogs('seller.tasks', 'ERROR'):
+            job = self.run_import_of(b'shop: a\ncategories: []\ngoods: []\n', withdraw_missing=True)
+        self.assertEqual(('failed', [{'error': 'Disk full'}]), (job.status, job.errors))
+
+
+class SellerOrdersTest(APITestCase):
+
+    def setUp(self):
+        self.url = reverse('seller:orders')
+        seller = User.objects.create_user(first_name='Ivan', last_name='Ivanov', email='ivan.ivanov@gmail.com',
+                                          is_active=True, type='seller', password='12345678')
+        self.seller_auth_token = Token.objects.create(user=seller)
+        other_seller = User.objects.create_user(first_name='Petr', last_name='Petrov', email='petr.petrov@gmail.com',
+                                                is_active=True, type='seller', password='12345678')
+        buyer = User.objects.create_user(first_name='Maria', last_name='Petrova', email='maria.petrova@gmail.com',
+                                         is_active=True, type='buyer', password='12345678')
+        shop = Shop.objects.create(name='Связной', user=seller)
+        other_shop = Shop.objects.create(name='Евросеть', user=other_seller)
+        category = Category.objects.create(id=224, name='Смартфоны')
+        cards = []
+        for number, card_shop in enumerate([shop, shop, other_shop]):
+            product = Product.objects.create(name=f'Product {number}', category=category)
+            cards.append(ProductCard.objects.create(product_code=number, model='model', product=product,
+                                                    shop=card_shop, price=Decimal('100'),
+                                                    price_rrc=Decimal('110'), quantity=10))
+        address = Address.objects.create(user=buyer, city='Moscow', street='Nevskogo', house='16')
+        self.cards = cards
+        self.orders = []
+        for quantities in [(1, 2, 3), (4, 0, 5), (0, 0, 6)]:
+            order = Order.objects.create(user=buyer, address=address, first_name='Maksim', last_name='Maksimov',
+                                         phone='89372773838')
+            OrderPosition.objects.bulk_create([
+                OrderPosition(order=order, product_card=card, shop_id=card.shop_id, price=card.price,
+                              quantity=quantity)
+                for card, quantity in zip(cards, quantities) if quantity])
+            self.orders.append(order)
+
+    def test_get_seller_orders(self):
+        response = self.client.get(self.url, headers={'Authorization': f'Token {self.seller_auth_token}'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([(self.orders[1].id, 4, '400.00'), (self.orders[0].id, 3, '300.00')],
+                         [(order['id'], order['items_count'], order['subtotal'])
+                          for order in response.json()['results']])
+
+    def test_get_seller_order_in_fixed_number_of_queries(self):
+        order = self.orders[0]
+        card = order.positions.filter(shop__user__email='ivan.ivanov@gmail.com').first().product_card
+        products = Product.objects.bulk_create([Product(name=f'Product {number + 3}', category_id=224)
+                                                for number in range(500)])
+        cards = ProductCard.objects.bulk_create([
+            ProductCard(product_code=number + 3, model='model', product=product, shop=card.shop,
+                        price=Decimal('100'), price_rrc=Decimal('110'), quantity=10)
+            for number, product in enumerate(products)])
+        OrderPosition.objects.bulk_create([OrderPosition(order=order, product_card=card, shop_id=card.shop_id,
+                                                         price=card.price, quantity=1) for card in cards])
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('seller:order', args=[order.id]),
+                                       headers={'Authorization': f'Token {self.seller_auth_token}'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(502, len(response.json()['items']))
+
+    def test_get_seller_order_invoice(self):
+        headers = {'Authorization': f'Token {self.seller_auth_token}'}
+        with TemporaryDirectory() as directory, override_settings(INVOICE_CACHE_DIR=directory):
+            response = self.client.get(reverse('seller:order_invoice', args=[self.orders[0].id]), headers=headers)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertEqual(f'attachment; filename="invoice_{self.orders[0].id}.csv"',
+                             response.headers['Content-Disposition'])
+            self.assertEqual(['№;Товар;Магазин;Цена;Количество;Сумма', '1;Product 0;Связной;100.00;1;100.00',
+                              '2;Product 1;Связной;100.00;2;200.00'], response.content.decode().splitlines())
+            response = self.client.get(reverse('seller:order_invoice', args=[self.orders[2].id]), headers=headers)
+            self.assertEqual(status.HTTP_409_CONFLICT, response.status_code)
+            response = self.client.get(reverse('seller:order_invoice', args=[self.orders[2].id + 1]),
+                                       headers=headers)
+            self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_get_seller_orders_not_modified(self):
+        headers = {'Authorization': f'Token {self.seller_auth_token}'}
+        etag = self.client.get(self.url, headers=headers).headers['ETag']
+        response = self.client.get(self.url, headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        order = self.orders[1]
+        order.first_name = 'Ivan'
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        response = self.client.get(self.url, headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_backfill_order_position_shops(self):
+        OrderPosition.objects.update(shop=None)
+        output = io.StringIO()
+        with mock.patch('seller.management.commands.backfill_order_position_shops.Command.batch_size', 2):
+            call_command('backfill_order_position_shops', stdout=output)
+        self.assertIn('updated: 6, left without a shop: 0', output.getvalue())
+        self.assertFalse(OrderPosition.objects.exclude(shop_id=F('product_card__shop_id')).exists())
+
+    def test_get_seller_orders_by_pages(self):
+        response = self.client.get(self.url, data={'page_size': 1},
+                                   headers={'Authorization': f'Token {self.seller_auth_token}'})
+        self.assertEqual([self.orders[1].id], [order['id'] for order in response.json()['results']])
+        response = self.client.get(response.json()['next'],
+                                   headers={'Authorization': f'Token {self.seller_auth_token}'})
+        self.assertEqual([self.orders[0].id], [order['id'] for order in response.json()['results']])
+        self.assertIsNone(response.json()['next'])
+
+    def post_orders_status(self, orders, order_status):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('seller:orders_status'),
+                                    headers={'Authorization': f'Token {self.seller_auth_token}'},
+                                    data={'orders': [order.id for order in orders], 'status': order_status},
+                                    format='json')
+
+    def keep_own_positions(self, orders):
+        OrderPosition.objects.filter(order__in=orders, product_card=self.cards[2]).delete()
+
+    def test_confirm_orders(self):
+        self.keep_own_positions(self.orders[:2])
+        response = self.post_orders_status(self.orders, 'confirmed')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual({'updated': [self.orders[0].id, self.orders[1].id],
+                          'refused': [{'id': self.orders[2].id, 'status': None, 'reason': 'not_found'}]},
+                         response.json())
+        self.assertEqual(['confirmed', 'confirmed', 'new'],
+                         [order.status for order in Order.objects.order_by('id')])
+        self.assertEqual([f'Заказ {self.orders[0].id}', f'Заказ {self.orders[1].id}'],
+                         [message.subject for message in mail.outbox if message.subject.startswith('Заказ')])
+
+    def test_refuse_invalid_transition(self):
+        self.keep_own_positions(self.orders[:1])
+        response = self.post_orders_status(self.orders[:1], 'delivered')
+        self.assertEqual({'updated': [],
+                          'refused': [{'id': self.orders[0].id, 'status': 'new', 'reason': 'transition'}]},
+                         response.json())
+        response = self.post_orders_status(self.orders[:1], 'new')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_refuse_orders_shared_with_other_shops(self):
+        response = self.post_orders_status(self.orders[:1], 'canceled')
+        self.assertEqual({'updated': [],
+                          'refused': [{'id': self.orders[0].id, 'status': 'new', 'reason': 'shared'}]},
+                         response.json())
+        self.assertEqual('new', Order.objects.get(id=self.orders[0].id).status)
+        self.assertEqual([10, 10, 10], [card.quantity for card in ProductCard.objects.order_by('id')])
+
+    def test_deliver_orders(self):
+        self.keep_own_positions(self.orders[:1])
+        Order.objects.filter(id=self.orders[0].id).update(status='sent')
+        response = self.post_orders_status(self.orders[:1], 'delivered')
+        self.assertEqual([self.orders[0].id], response.json()['updated'])
+        self.assertIsNotNone(Order.objects.get(id=self.orders[0].id).delivered_at)
+
+    def test_cancel_orders_restocks(self):
+        self.keep_own_positions(self.orders[1:2])
+        ProductCard.objects.filter(id=self.cards[0].id).update(quantity=0, status='sold')
+        response = self.post_orders_status(self.orders[:2], 'canceled')
+        self.assertEqual([self.orders[1].id], response.json()['updated'])
+        self.assertEqual([(4, 'in_stock'), (10, 'in_stock'), (10, 'in_stock')],
+                         [(card.quantity, card.status) for card in ProductCard.objects.order_by('id')])
+        response = self.post_orders_status(self.orders[1:2], 'confirmed')
+        self.assertEqual([{'id': self.orders[1].id, 'status': 'canceled', 'reason': 'transition'}],
+                         response.json()['refused'])
+
+
+class ProductCardImageTest(APITestCase):
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=directory.name, IMAGE_PIPELINE_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        seller = User.objects.create_user(first_name='Ivan', last_name='Ivanov', email='ivan.ivanov@gmail.com',
+                                          is_active=True, type='seller', password='12345678')
+        self.seller_auth_token = Token.objects.create(user=seller)
+        product = Product.objects.create(name='Product', category=Category.objects.create(id=224, name='Смартфоны'))
+        self.product_card = ProductCard.objects.create(product_code=1, model='model', product=product,
+                                                       shop=Shop.objects.create(name='Связной', user=seller),
+                                                       price=Decimal('100'), price_rrc=Decimal('110'), quantity=1)
+        self.url = reverse('seller:product_card_image', args=[self.product_card.id])
+
+    def get_upload(self, name, color):
+        stream = io.BytesIO()
+        PILImage.new('RGB', (200, 100), color).save(stream, 'JPEG')
+        return SimpleUploadedFile(name, stream.getvalue(), content_type='image/jpeg')
+
+    def test_post_images(self):
+        images = [self.get_upload('photo.jpg', 'red'), self.get_upload('photo.jpg', 'blue')]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {'images': images}, format='multipart',
+                                        headers={'Authorization': f'Token {self.seller_auth_token}'})
+            self.assertEqual(2, len(default_storage.listdir(STAGING_DIRECTORY)[1]))
+        self.assertEqual(status.HTTP_202_ACCEPTED, response.status_code)
+        names = [image.image.name for image in Image.objects.filter(product_card=self.product_card)]
+        self.assertEqual(2, len(set(names)))
+        self.assertTrue(all(name.startswith('content/') for name in names))
+        self.assertEqual([], default_storage.listdir(STAGING_DIRECTORY)[1])
+        self.assertFalse(default_storage.exists('photo.jpg'))
+
+    def test_post_invalid_image(self):
+        text = SimpleUploadedFile('photo.jpg', b'not an image', content_type='image/jpeg')
+        response = self.client.post(self.url, {'images': [text]}, format='multipart',
+                                    headers={'Authorization': f'Token {self.seller_auth_token}'})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertFalse(Image.objects.exists())
+        self.assertEqual([], default_storage.listdir(STAGING_DIRECTORY)[1])
+
+    def stage(self, name, color):
+        return default_storage.save(f'{STAGING_DIRECTORY}/{name}', self.get_upload(name, color))
+
+    def test_delete_images(self):
+        results = ingest_images(self.product_card, [self.stage('red.jpg', 'red'), self.stage('blue.jpg', 'blue'),
+                                                    self.stage('green.jpg', 'green')])
+        red, blue, green = Image.objects.filter(product_card=self.product_card).order_by('id')
+        thumbnail_name = blue.image['small'].name
+        default_storage.delete(green.image.name)
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(self.url, {'images': [blue.id, green.id, blue.id]}, format='json',
+                                          headers={'Authorization': f'Token {self.seller_auth_token}'})
+        image_queries = [query['sql'] for query in queries if '"products_image"' in query['sql']]
+        self.assertEqual(1, sum(sql.startswith('DELETE') for sql in image_queries))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual({'deleted': 2}, response.json())
+        self.assertEqual([red.id], list(Image.objects.values_list('id', flat=True)))
+        self.assertTrue(default_storage.exists(red.image.name))
+        self.assertFalse(default_storage.exists(blue.image.name))
+        self.assertFalse(default_storage.exists(thumbnail_name))
+        self.assertEqual({results[0]['name']}, set(Thumbnail.objects.values_list('source', flat=True)))
+        self.assertEqual(1, len(CatalogueEntry.objects.get(product_card=self.product_card).images))
+
+    def test_delete_images_of_other_card(self):
+        other_card = ProductCard.objects.create(product_code=2, model='model', product=self.product_card.product,
+                                                shop=self.product_card.shop, price=Decimal('100'),
+                                                price_rrc=Decimal('110'), quantity=1)
+        ingest_images(other_card, [self.stage('red.jpg', 'red')])
+        image = Image.objects.get()
+        for images_ids in ([image.id], [image.id + 1]):
+            response = self.client.delete(self.url, {'images': images_ids}, format='json',
+                                          headers={'Authorization': f'Token {self.seller_auth_token}'})
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertTrue(Image.objects.exists())
+
+
+class PriceListParserTest(TestCase):
+
+    def test_read_yaml_price_list(self):
+        stream = io.BytesIO('shop: Связной\n'
+                            'categories:\n  - id: 224\n    name: Смартфоны\n'
+                            'goods:\n  - id: 1\n    name: a\n  - id: 2\n    name: b\n'.encode())
+        header, goods = read_price_list(stream)
+        self.assertEqual({'shop': 'Связной', 'categories': [{'id': 224, 'name': 'Смартфоны'}]}, header)
+        self.assertEqual([{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}], list(goods))
+
+    def test_read_yaml_price_list_with_goods_before_categories(self):
+        stream = io.BytesIO(b'shop: a\ngoods: []\ncategories: []\n')
+        header, goods = read_price_list(stream)
+        with self.assertRaises(PriceListFormatError):
+            list(goods)
+
+    def test_read_json_lines_price_list(self):
+        stream = io.BytesIO(b'{"shop": "a", "categories": []}\n{"id": 1}\n\n{"id": 2}\n')
+        header, goods = read_price_list(stream, 'jsonl')
+        self.assertEqual({'shop': 'a', 'categories': []}, header)
+        self.assertEqual([{'id': 1}, {'id': 2}], list(goods))
+
+
+class GoodsValidatorTest(TestCase):
+
+    def setUp(self):
+        self.good = {'id': 4216292, 'category': 224, 'model': 'apple/iphone/xs-max',
+                     'name': 'Смартфон Apple iPhone XS Max 512GB (золотистый)',
+                     'price': 110000, 'price_rrc': '116990.5', 'quantity': 14,
+                     'parameters': {'Диагональ (дюйм)': 6.5, 'Цвет': 'золотистый'}}
+
+    def test_validate_goods(self):
+        goods, errors = GoodsValidator([224]).validate([(0, self.good)])
+        self.assertEqual([], errors)
+        self.assertEqual(Decimal('110000.00'), goods[0]['price'])
+        self.assertEqual(Decimal('116990.50'), goods[0]['price_rrc'])
+        self.assertEqual({'Диагональ (дюйм)': '6.5', 'Цвет': 'золотистый'}, goods[0]['parameters'])
+
+    def test_validate_goods_with_errors(self):
+        rows = [(0, self.good),
+                (1, {**self.good, 'category': 15, 'price': '1.234', 'quantity': -1}),
+                (2, {key: value for key, value in self.good.items() if key != 'name'}),
+                (3, 'good')]
+        goods, errors = GoodsValidator([224]).validate(rows)
+        self.assertEqual(1, len(goods))
+        self.assertEqual([
+            {'row': 1, 'price': ['Ensure that there are no more than 2 decimal places.'],
+             'quantity': ['Ensure this value is greater than or equal to 0.'],
+             'category': ["Good's categories must correspond to the listed categories."]},
+            {'row': 2, 'name': ['This field is required.']},
+            {'row': 3, 'non_field_errors': ['Invalid data. Expected a dictionary, but got str.']},
+        ], errors)
+
+    def test_validate_categories_clash(self):
+        Category.objects.create(id=224, name='Смартфоны')
+        serializer = ShopPricesSerializer(data={'shop': 'Связной', 'categories': [{'id': 1, 'name': 'Смартфоны'}]})
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(["Category 'Смартфоны' already exists with '224' id."],
+                         serializer.errors['categories'])
@@ -0,0 +1,154 @@
+from decimal import Decimal, InvalidOperation
+
+
+MAX_POSITIVE_INTEGER = 2147483647
+PRICE_MAX_DIGITS = 15
+PRICE_DECIMAL_PLACES = 2
+PRICE_QUANTUM = Decimal('0.01')
+MAX_WHOLE_PRICE = 10 ** (PRICE_MAX_DIGITS - PRICE_DECIMAL_PLACES)
+MISSING = object()
+
+
+class FieldError(Exception):
+    pass
+
+
+def clean_integer(value, min_value):
+    if type(value) is not int:
+        if isinstance(value, bool) or not isinstance(value, (int, str, float)):
+            raise FieldError('A valid integer is required.')
+        try:
+            decimal = Decimal(str(value).strip())
+            value = int(decimal)
+        except (InvalidOperation, ValueError, OverflowError):
+            raise FieldError('A valid integer is required.')
+        if decimal != value:
+            raise FieldError('A valid integer is required.')
+    if value < min_value:
+        raise FieldError(f'Ensure this value is greater than or equal to {min_value}.')
+    if value > MAX_POSITIVE_INTEGER:
+        raise FieldError(f'Ensure this value is less than or equal to {MAX_POSITIVE_INTEGER}.')
+    return value
+
+
+def clean_string(value, max_length, allow_blank=False):
+    if type(value) is not str:
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise FieldError('Not a valid string.')
+        value = str(value)
+    value = value.strip()
+    if not value and not allow_blank:
+        raise FieldError('This field may not be blank.')
+    if max_length is not None and len(value) > max_length:
+        raise FieldError(f'Ensure this field has no more than {max_length} characters.')
+    return value
+
+
+def clean_price(value):
+    if type(value) is int and 0 < value < MAX_WHOLE_PRICE:
+        return Decimal(value).quantize(PRICE_QUANTUM)
+    if isinstance(value, bool) or not isinstance(value, (int, str, float, Decimal)):
+        raise FieldError('A valid number is required.')
+    try:
+        value = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise FieldError('A valid number is required.')
+    if not value.is_finite():
+        raise FieldError('A valid number is required.')
+    sign, digits, exponent = value.as_tuple()
+    decimal_places = max(-exponent, 0)
+    whole_digits = max(len(digits) + exponent, 0)
+    if decimal_places > PRICE_DECIMAL_PLACES:
+        raise FieldError(f'Ensure that there are no more than {PRICE_DECIMAL_PLACES} decimal places.')
+    if whole_digits > PRICE_MAX_DIGITS - PRICE_DECIMAL_PLACES:
+        raise FieldError(f'Ensure that there are no more than '
+                         f'{PRICE_MAX_DIGITS - PRICE_DECIMAL_PLACES} digits before the decimal point.')
+    if value < PRICE_QUANTUM:
+        raise FieldError(f'Ensure this value is greater than or equal to {PRICE_QUANTUM}.')
+    return value.quantize(PRICE_QUANTUM)
+
+
+def clean_parameters(value, names):
+    if not isinstance(value, dict):
+        raise FieldError(f'Expected a dictionary of items but got type "{type(value).__name__}".')
+    parameters = {}
+    for name, parameter_value in value.items():
+        try:
+            clean_name = names.get(name)
+            if clean_name is None:
+                clean_name = names[name] = clean_string(name, 40)
+            if type(parameter_value) is not str or len(parameter_value) > 100:
+                parameter_value = clean_string(parameter_value, 100, allow_blank=True)
+            parameters[clean_name] = parameter_value.strip()
+        except FieldError as exc:
+            raise FieldError(f'{name}: {exc}')
+    return parameters
+
+
+class GoodsValidator:
+    """
+    Validates a batch of goods column by column with plain Python checks
+    instead of a DRF serializer per good. Each column is checked with a cheap
+    test for the common well-formed value first and only falls back to the
+    full conversion otherwise. The rules and messages follow the ProductCard
+    fields; errors are reported per row like serializer errors.
+    """
+
+    def __init__(self, categories):
+        self.categories = set(categories)
+        self.parameters_names = {}
+
+    def get_columns(self):
+        return (
+            ('id', True, lambda value: clean_integer(value, 1),
+             lambda value: type(value) is int and 0 < value <= MAX_POSITIVE_INTEGER),
+            ('category', True, lambda value: clean_integer(value, 1),
+             lambda value: type(value) is int and value in self.categories),
+            ('model', True, lambda value: clean_string(value, 80, allow_blank=True),
+             lambda value: type(value) is str and len(value) <= 80 and value == value.strip()),
+            ('name', True, lambda value: clean_string(value, 80),
+             lambda value: type(value) is str and 0 < len(value) <= 80 and value == value.strip()),
+            ('description', False,
+             lambda value: None if value is None else clean_string(value, None, allow_blank=True),
+             lambda value: value is None or type(value) is str and value == value.strip()),
+            ('price', True, clean_price, lambda value: False),
+            ('price_rrc', True, clean_price, lambda value: False),
+            ('quantity', True, lambda value: clean_integer(value, 0),
+             lambda value: type(value) is int and 0 <= value <= MAX_POSITIVE_INTEGER),
+            ('parameters', False, lambda value: clean_parameters(value, self.parameters_names),
+             lambda value: False),
+        )
+
+    def validate(self, rows):
+        errors = {}
+        goods = []
+        cleaned = {}
+        for row, good in rows:
+            if isinstance(good, dict):
+                goods.append((row, good, cleaned.setdefault(row, {})))
+            else:
+                errors[row] = {'non_field_errors': [f'Invalid data. Expected a dictionary, '
+                                                    f'but got {type(good).__name__}.']}
+
+        for field, required, clean, is_valid in self.get_columns():
+            for row, good, cleaned_good in goods:
+                value = good.get(field, MISSING)
+                if value is MISSING:
+                    if required:
+                        errors.setdefault(row, {})[field] = ['This field is required.']
+                    continue
+                if not is_valid(value):
+                    try:
+                        value = clean(value)
+                    except FieldError as exc:
+                        errors.setdefault(row, {})[field] = [f'{exc}']
+                        continue
+                cleaned_good[field] = value
+
+        for row, good in cleaned.items():
+            if 'category' in good and good['category'] not in self.categories:
+                errors.setdefault(row, {})['category'] = [
+                    "Good's categories must correspond to the listed categories."]
+
+        valid_goods = [good for row, good in cleaned.items() if row not in errors]
+        return valid_goods, [{'row': row, **errors[row]} for row in sorted(errors)]
@@ -1,27 +1,40 @@
 from django.shortcuts import render, get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
-import requests
 from urllib3 import request
-from yaml import load as load_yaml, YAMLError
-from yaml.loader import SafeLoader
 from django.http import JsonResponse, HttpResponse
 from rest_framework import status
-from django.db.models import Prefetch
+from django.db.models import Prefetch, Sum, F, Subquery, OuterRef
 from drf_spectacular.utils import extend_schema, OpenApiResponse
-from django.core.files.storage import FileSystemStorage
-from django.core.files import File
+from rest_framework.parsers import JSONParser, FormParser
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
 from .permissions import IsSeller, IsProductCardOwner
-from .serializers import (ShopPricesUrlSerializer, ShopPricesSerializer, ShopStatusSerializer,
-                          OrdersSerializer, OrdersItemSerializer, YamlErrorSerializer,
-                          ImagesPostSerializer, ImagesDeleteSerializer)
-from products.models import Category, ProductCard, Product, Parameter, ProductParameter
+from .serializers import (ShopPricesUrlSerializer, ShopStatusSerializer,
+                          OrdersPageSerializer, OrdersItemSerializer, YamlErrorSerializer,
+                          OrdersStatusSerializer, OrdersStatusResultSerializer,
+                          ImagesPostSerializer, ImagesDeleteSerializer, ImagesDeleteResultSerializer,
+                          PriceListImportNewSerializer, PriceListImportSerializer)
+from products.models import ProductCard
 from buyer.models import Order, OrderPosition
-from .models import Shop
+from buyer.pagination import OrderCursorPagination
+from buyer.queries import get_order_detail
+from buyer.invoices import get_invoice
+from buyer.workflow import transition_orders
+from .models import Shop, PriceListImport
 from retail_order_api.docs_responses import (response_unauthorized, DetailResponseSerializer,
                                              IncorrectDataSerializer)
-from .tasks import save_images, delete_images
+from .tasks import save_images, import_price_list_task
+from products.images import delete_images
+from retail_order_api.dispatch import dispatch
+from retail_order_api.uploads import StagingMultiPartParser
+from retail_order_api.versions import get_etag
+
+
+def get_seller_orders_etag(request, *args, **kwargs):
+    return get_etag(request, f'orders:seller:{request.user.id}')
 
 
 responses_no_access = {**response_unauthorized,
@@ -45,53 +58,34 @@ class ShopPrices(SellerAPIView):
 
     @extend_schema(
         request=ShopPricesUrlSerializer,
-        responses={status.HTTP_200_OK: ShopPricesSerializer,
+        responses={status.HTTP_202_ACCEPTED: PriceListImportNewSerializer,
                    status.HTTP_400_BAD_REQUEST: OpenApiResponse(response=IncorrectDataSerializer,
                                                                 description='Incorrect data.'),
-                   status.HTTP_422_UNPROCESSABLE_ENTITY: OpenApiResponse(response=YamlErrorSerializer),
                    **responses_no_access}
     )
     def post(self, request):
         serializer = ShopPricesUrlSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         validated_data = serializer.validated_data
-        stream = requests.get(validated_data['url']).content
-        try:
-            data = load_yaml(stream, Loader=SafeLoader)
-            serializer = ShopPricesSerializer(data=data)
-            serializer.is_valid(raise_exception=True)
-            validated_data = serializer.validated_data
-            shop, created = Shop.objects.get_or_create(name=validated_data['shop'], user=request.user)
-            categories = []
-            for category in validated_data['categories']:
-                category, created = Category.objects.get_or_create(id=category['id'], name=category['name'])
-                categories.append(category)
-            shop.categories.add(*categories)
-
-            for good in validated_data['goods']:
-                product, created = Product.objects.get_or_create(name=good['name'], category_id=good['category'])
-
-                product_card, created = ProductCard.objects.update_or_create(
-                    product_code=good['id'], product=product, shop=shop,
-                    defaults={'model': good['model'],
-                              'description': good.get('description'),
-                              'price': good['price'],
-                              'price_rrc': good['price_rrc'],
-                              'quantity': good['quantity'],
-                              'status': None}
-                )
-
-                for parameter, value in good['parameters'].items():
-                    parameter, created = Parameter.objects.get_or_create(name=parameter)
-                    product_parameter, created = ProductParameter.objects.update_or_create(
-                    product_card=product_card, parameter=parameter, defaults={'value': value}
-                    )
-
-            return HttpResponse(status=status.HTTP_204_NO_CONTENT)
-        except YAMLError as exc:
-            return JsonResponse(
-                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                data={'yaml_error': f'{exc.__dict__["problem"].capitalize()}.'})
+        job = PriceListImport.objects.create(user=request.user, **validated_data)
+        import_price_list_task.delay(job.id)
+        serializer = PriceListImportNewSerializer(job)
+        return JsonResponse(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+@extend_schema(tags=["shop"])
+class ShopPricesJob(SellerAPIView):
+
+    @extend_schema(
+        responses={status.HTTP_200_OK: PriceListImportSerializer,
+                   status.HTTP_404_NOT_FOUND: OpenApiResponse(response=DetailResponseSerializer,
+                                                              description='Import job not found.'),
+                   **responses_no_access}
+    )
+    def get(self, request, job_id):
+        job = get_object_or_404(PriceListImport, id=job_id, user=request.user)
+        serializer = PriceListImportSerializer(job)
+        return JsonResponse(serializer.data)
 
 
 @extend_schema(tags=["shop"])
@@ -132,14 +126,48 @@ class ShopStatus(SellerAPIView):
 @extend_schema(tags=["shop"])
 class OrdersView(SellerAPIView):
 
+    def get_orders(self):
+        positions = OrderPosition.objects.filter(shop=self.user.shop)
+        summary = (positions.filter(order=OuterRef('pk')).values('order').
+                   annotate(items_count=Sum('quantity'), subtotal=Sum(F('price') * F('quantity'))))
+        return (Order.objects.filter(id__in=positions.values('order_id')).
+                annotate(items_count=Subquery(summary.values('items_count')),
+                         subtotal=Subquery(summary.values('subtotal'))))
+
     @extend_schema(
-        responses={status.HTTP_200_OK: OrdersSerializer(many=True),
+        responses={status.HTTP_200_OK: OrdersPageSerializer,
                    **responses_no_access}
     )
+    @method_decorator(cache_control(private=True, no_cache=True))
+    @method_decorator(condition(etag_func=get_seller_orders_etag))
     def get(self, request):
-        orders = Order.objects.filter(positions__product_card__shop=self.user.shop).order_by('-created_at')
-        serializer = OrdersSerializer(orders, many=True)
-        return JsonResponse(serializer.data, safe=False)
+        page = OrderCursorPagination().get_page(self.get_orders(), request, view=self)
+        serializer = OrdersPageSerializer(page)
+        return JsonResponse(serializer.data)
+
+
+@extend_schema(tags=["shop"])
+class OrdersStatusView(SellerAPIView):
+
+    @extend_schema(
+        request=OrdersStatusSerializer,
+        responses={status.HTTP_200_OK: OrdersStatusResultSerializer,
+                   status.HTTP_400_BAD_REQUEST: OpenApiResponse(response=IncorrectDataSerializer,
+                                                                description='Incorrect data.'),
+                   **responses_no_access}
+    )
+    def post(self, request):
+        serializer = OrdersStatusSerializer(data=request.data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        orders_ids = set(serializer.validated_data['orders'])
+        positions = OrderPosition.objects.filter(shop=self.user.shop, order_id__in=orders_ids)
+        orders = Order.objects.filter(id__in=positions.values('order_id'))
+        updated, refused = transition_orders(orders, serializer.validated_data['status'], shop=self.user.shop)
+        refused = [{'id': order_id, **refused.get(order_id, {'status': None, 'reason': 'not_found'})}
+                   for order_id in sorted(orders_ids.difference(updated))]
+        serializer = OrdersStatusResultSerializer({'updated': updated, 'refused': refused})
+        return JsonResponse(serializer.data)
 
 
 @extend_schema(tags=["shop"])
@@ -154,19 +182,37 @@ class OrdersItemView(SellerAPIView):
                    **responses_no_access}
     )
     def get(self, request, order_id):
-        order = get_object_or_404(Order, id=order_id)
-        seller_positions = (order.positions.filter(product_card__shop=self.user.shop).
-                           select_related('product_card', 'product_card__product'))
-
-        if not seller_positions:
+        order = get_object_or_404(get_order_detail(shop=self.user.shop, to_attr='seller_positions'), id=order_id)
+        if not order.seller_positions:
             return JsonResponse({'detail': "No seller's products in order."}, status=status.HTTP_409_CONFLICT)
-        order.seller_positions = seller_positions
         serializer = OrdersItemSerializer(order)
         return JsonResponse(serializer.data)
 
 
+@extend_schema(tags=["shop"])
+class OrdersItemInvoiceView(SellerAPIView):
+
+    @extend_schema(
+        responses={(status.HTTP_200_OK, 'text/csv'): OpenApiResponse(description="CSV invoice of the seller's "
+                                                                                 "products in the order."),
+                   status.HTTP_404_NOT_FOUND: OpenApiResponse(response=DetailResponseSerializer,
+                                                              description='Order not found.'),
+                   status.HTTP_409_CONFLICT: OpenApiResponse(response=DetailResponseSerializer,
+                                                             description="No seller's products in order."),
+                   **responses_no_access}
+    )
+    def get(self, request, order_id):
+        invoice = get_invoice(order_id, shop_id=self.user.shop.id)
+        if invoice is None:
+            get_object_or_404(Order, id=order_id)
+            return JsonResponse({'detail': "No seller's products in order."}, status=status.HTTP_409_CONFLICT)
+        return HttpResponse(invoice['csv'], content_type='text/csv; charset=utf-8',
+                            headers={'Content-Disposition': f'attachment; filename="invoice_{order_id}.csv"'})
+
+
 @extend_schema(tags=["shop"])
 class ProductCardImage(SellerAPIView):
+    parser_classes = (JSONParser, FormParser, StagingMultiPartParser)
 
     @extend_schema(
         request=ImagesPostSerializer,
@@ -186,18 +232,13 @@ class ProductCardImage(SellerAPIView):
         images = request.FILES.getlist('images')
         serializer = ImagesPostSerializer(data={'images': images})
         serializer.is_valid(raise_exception=True)
-        validated_data = serializer.validated_data
-        storage = FileSystemStorage()
-        images_names = []
-        for image in validated_data['images']:
-            storage.save(image.name, File(image))
-            images_names.append(image.name)
-        save_images.delay(product_card_id, images_names)
+        handles = [image.claim() for image in serializer.validated_data['images']]
+        dispatch(save_images, product_card_id, handles)
         return HttpResponse(status=status.HTTP_202_ACCEPTED)
 
     @extend_schema(
         request=ImagesDeleteSerializer,
-        responses={status.HTTP_202_ACCEPTED: OpenApiResponse(description='Accepted.'),
+        responses={status.HTTP_200_OK: ImagesDeleteResultSerializer,
                    status.HTTP_404_NOT_FOUND: OpenApiResponse(response=DetailResponseSerializer,
                                                               description='Product card not found.'),
                    status.HTTP_400_BAD_REQUEST: OpenApiResponse(response=IncorrectDataSerializer,
@@ -212,6 +253,6 @@ class ProductCardImage(SellerAPIView):
         self.check_object_permissions(request, obj=product_card)
         serializer = ImagesDeleteSerializer(data=request.data, context={'product_card': product_card})
         serializer.is_valid(raise_exception=True)
-        images_ids = [image.id for image in serializer.validated_data['images']]
-        delete_images.delay(images_ids)
-        return HttpResponse(status=status.HTTP_202_ACCEPTED)
+        deleted = delete_images(product_card, serializer.validated_data['images'])
+        serializer = ImagesDeleteResultSerializer({'deleted': deleted})
+        return JsonResponse(serializer.data)
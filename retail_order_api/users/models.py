@@ -7,7 +7,8 @@ from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.tokens import default_token_generator
 from django_cleanup import cleanup
-from easy_thumbnails.fields import ThumbnailerImageField
+
+from retail_order_api.storage import ContentAddressedImageField
 
 
 USER_TYPE_CHOICES = (
@@ -63,9 +64,9 @@ class User(AbstractUser):
     last_name = TitleField(verbose_name='Last name',
                            max_length=60)
     username = None
-    avatar = ThumbnailerImageField(verbose_name="Avatar", upload_to='users/avatars',
-                                   resize_source=dict(quality=100, size=(50, 50), sharpen=True),
-                                   blank=True)
+    avatar = ContentAddressedImageField(verbose_name="Avatar", upload_to='users/avatars',
+                                        resize_source=dict(quality=100, size=(50, 50), sharpen=True),
+                                        blank=True)
     email = models.EmailField(unique=True)
     company = models.CharField(verbose_name='Company', max_length=40, blank=True)
     job_title = models.CharField(verbose_name='Job title', max_length=40, blank=True)
@@ -3,6 +3,7 @@ from django.db.models.signals import post_save
 from django.dispatch import Signal
 from django.conf import settings
 
+from retail_order_api.dispatch import dispatch
 from .tasks import (send_confirmation_token_to_email_task,
                     send_reset_password_token_to_email_task)
 
@@ -14,13 +15,13 @@ update_email = Signal()
 def send_confirmation_token_to_email(sender, instance, created, **kwargs):
     user_id = instance.id
     if created:
-        send_confirmation_token_to_email_task.delay(user_id)
+        dispatch(send_confirmation_token_to_email_task, user_id)
 
 
 @receiver(update_email, dispatch_uid="update_email")
 def send_confirmation_token_to_new_email(sender, instance, **kwargs):
     user_id = instance.id
-    send_confirmation_token_to_email_task.delay(user_id)
+    dispatch(send_confirmation_token_to_email_task, user_id)
 
 
 reset_password = Signal()
@@ -28,7 +29,7 @@ reset_password = Signal()
 
 @receiver(reset_password)
 def send_reset_password_token_to_email(user, **kwargs):
-    send_reset_password_token_to_email_task.delay(user.id)
+    dispatch(send_reset_password_token_to_email_task, user.id)
 
 
 
@@ -8,9 +8,8 @@ from rest_framework.authtoken.models import Token
 from drf_spectacular.utils import extend_schema, OpenApiResponse
 from rest_framework.response import Response
 from rest_framework.authtoken.views import ObtainAuthToken
-from rest_framework.parsers import MultiPartParser
-from django.core.files.storage import FileSystemStorage
-from django.core.files import File
+from retail_order_api.dispatch import dispatch
+from retail_order_api.uploads import StagingMultiPartParser
 
 from .serializers import (UserSerializer, UserUpdateSerializer,
                           PasswordResetTokenSerializer, PasswordResetSerializer,
@@ -231,7 +230,7 @@ class DeleteAuthToken(APIView):
 
 class AvatarView(APIView):
     permission_classes = [IsAuthenticated]
-    parser_classes = (MultiPartParser,)
+    parser_classes = (StagingMultiPartParser,)
 
     @extend_schema(
         request=AvatarSerializer,
@@ -245,10 +244,7 @@ class AvatarView(APIView):
             return JsonResponse({'detail': 'Only one image.'}, status=status.HTTP_400_BAD_REQUEST)
         serializer = AvatarSerializer(data=request.FILES)
         serializer.is_valid(raise_exception=True)
-        image = serializer.validated_data['image']
-        storage = FileSystemStorage()
-        storage.save(image.name, File(image))
-        save_avatar.delay(request.user.id, storage.path(image.name), image.name)
+        dispatch(save_avatar, request.user.id, serializer.validated_data['image'].claim())
         return HttpResponse(status=status.HTTP_202_ACCEPTED)
 
 